@@ -1,9 +1,13 @@
 import json
-from django.db import models
+from django.db import models, transaction
 from django.contrib import admin
+from django.core.serializers.json import DjangoJSONEncoder
 from django.forms.widgets import Textarea
+from django.urls import reverse
+from django.utils.html import format_html
 
 from . import models as settlers
+from .codec import GameField
 
 
 class JsonTextarea(Textarea):
@@ -13,7 +17,9 @@ class JsonTextarea(Textarea):
         self.attrs['style'] = 'font-family: monospace; width: 95%; height: 40em'
 
     def format_value(self, value):
-        return json.dumps(json.loads(str(value)), indent=4)
+        if isinstance(value, str):
+            value = json.loads(value) if value else {}
+        return json.dumps(value, indent=4, cls=DjangoJSONEncoder)
 
 
 @admin.register(settlers.SettlersProfile)
@@ -23,14 +29,102 @@ class SettlersProfileAdmin(admin.ModelAdmin):
 
 @admin.register(settlers.Settlers)
 class SettlersAdmin(admin.ModelAdmin):
-    list_display = ('id', 'player_names')
+    list_display = ('id', 'player_names', 'current_stage', 'turn_count', 'is_finished', 'updated')
+    list_filter = ('current_stage', 'is_finished')
+    ordering = ('-updated', '-id')
+    show_full_result_count = False
     filter_horizontal = ['player_profiles']
+    readonly_fields = ('board', 'turn_log', 'trade_offers')
+    actions = ['migrate_turns']
+    formfield_overrides = {
+        GameField: {'widget': JsonTextarea},
+    }
+
+    def get_exclude(self, request, obj=None):
+        # Embedded turns can run to megabytes; the game is editable as raw
+        # JSON once they are moved into the turn log, which has its own editor
+        if obj is not None and 'turns' in obj.game:
+            return ('game',)
+        return ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match and match.url_name == 'settlers_settlers_changelist':
+            # The listing only shows the denormalized summary columns
+            queryset = queryset.defer('game')
+        return queryset
+
+    @admin.display(description='Board')
+    def board(self, obj):
+        if not obj.pk:
+            return '-'
+
+        board = {k: v for k, v in obj.game.items() if k not in ('turns', 'tradeOffers')}
+        return format_html('<pre>{}</pre>', json.dumps(board, indent=2, cls=DjangoJSONEncoder))
+
+    @admin.display(description='Turns')
+    def turn_log(self, obj):
+        if not obj.pk:
+            return '-'
+
+        if 'turns' in obj.game:
+            return f'{len(obj.game["turns"])} embedded turn(s), not yet moved into the turn log'
+
+        url = reverse('admin:settlers_settlersturn_changelist')
+        return format_html(
+            '<a href="{}?settlers__id__exact={}">Browse {} turn(s)</a>',
+            url,
+            obj.pk,
+            obj.turn_count
+        )
+
+    @admin.display(description='Trade offers')
+    def trade_offers(self, obj):
+        offers = obj.game.get('tradeOffers') if obj.pk else None
+        if not offers:
+            return '-'
+        return format_html('<pre>{}</pre>', json.dumps(offers, indent=2, cls=DjangoJSONEncoder))
+
+    @admin.action(description='Move embedded turns into the turn log')
+    def migrate_turns(self, request, queryset):
+        count = 0
+        for obj in queryset.iterator():
+            try:
+                count += obj.migrate_turns()
+            except settlers.StaleGameError:
+                continue
+        self.message_user(request, f'Moved {count} turn(s)')
+
+
+@admin.register(settlers.SettlersTurn)
+class SettlersTurnAdmin(admin.ModelAdmin):
+    list_display = ('index', 'settlers_id', 'color', 'roll', 'action_types', 'played')
+    list_display_links = ('index',)
+    list_filter = ('color',)
+    ordering = ('settlers', 'index')
+    show_full_result_count = False
+    raw_id_fields = ('settlers',)
+    readonly_fields = ('settlers', 'index')
     formfield_overrides = {
         models.TextField: {'widget': JsonTextarea},
     }
 
-    def player_names(self, obj):
-        return ', '.join(obj.player_profiles.select_related('user').values_list(
-            'user__username',
-            flat=True
-        ))
+    @admin.display(description='Actions')
+    def action_types(self, obj):
+        return ', '.join(action['type'] for action in obj.actions)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Removing a turn would renumber the rest of the history
+        return False
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            # Snapshots after the edited turn replayed the old version of it
+            obj.settlers.snapshots.filter(index__gt=obj.index).delete()
+            # Bump the version so caches and open pages see the change
+            obj.settlers.update_game(lambda game: True)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class SettlersConfig(AppConfig):
     name = 'settlers'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from .board import Topology
+        from .layouts import LAYOUTS
+
+        # Compile the adjacency tables once per process rather than on the first turn
+        for layout in LAYOUTS.values():
+            Topology.compile(len(layout['grid'][0]), ''.join(layout['grid']))
@@ -0,0 +1,187 @@
+import re
+from functools import lru_cache
+
+from .layouts import get_layout
+
+NODES = 'abcdef'
+NODE_INDEX = {n: i for i, n in enumerate(NODES)}
+
+
+def parse_grid(grid):
+    if isinstance(grid, (list, tuple)):
+        cells = [cell for row in grid for cell in (row if isinstance(row, list) else [row])]
+        if cells and len(cells[0]) == 1:
+            cells = [f'{cell}0' for cell in cells]
+        return cells
+
+    return re.findall(r'..', grid)
+
+
+def board_data(game):
+    """
+    Return ``(layout_name, grid_cells, harbors)`` for both the current and the
+    legacy ``init`` game formats.
+    """
+    init = game.get('init')
+    if init:
+        harbors = {f'{h["hex"]}{h["edge"]}': h['resource'] for h in init['harbors']}
+        return init.get('name', 'standard34'), parse_grid(init['grid']), harbors
+
+    return game.get('layout', 'standard34'), parse_grid(game['grid']), game['harbors']
+
+
+class Topology:
+    """
+    Hex, vertex and edge adjacency for one board shape, built the same way as
+    ``Board`` in ``models/board.js``. Hexes are numbered land first, then water.
+    """
+
+    def __init__(self, width, mask):
+        self.width = width
+        self.height = len(mask) // width
+        self.mask = mask
+
+        cells = {}
+        hex_id = 1
+        for kind in 'LW':
+            for index, cell_kind in enumerate(mask):
+                if cell_kind == kind:
+                    cells[index] = hex_id
+                    hex_id += 1
+
+        self.cell_hex = cells
+        self.hex_cell = {h: c for c, h in cells.items()}
+        self.land = tuple(h for c, h in sorted(cells.items()) if mask[c] == 'L')
+
+        cell_vertices = {i: [None] * 6 for i in range(len(mask))}
+        cell_edges = {i: [None] * 6 for i in range(len(mask))}
+        vertex_cells = []
+        edge_cells = []
+
+        def cell_at(i, j):
+            if 0 <= i < self.width and 0 <= j < self.height:
+                return j * self.width + i
+            return None
+
+        for index, kind in enumerate(mask):
+            if kind == 'X':
+                continue
+
+            j, i = divmod(index, width)
+            col = i - 1 if j % 2 == 0 else i
+            for row, v, w, e in ((j - 1, 0, 2, 4), (j + 1, 3, 1, 5)):
+                vertex = len(vertex_cells)
+                vertex_cells.append([index])
+                cell_vertices[index][v] = vertex
+                for other, node in ((cell_at(col, row), w), (cell_at(col + 1, row), e)):
+                    if other is not None:
+                        cell_vertices[other][node] = vertex
+                        vertex_cells[vertex].append(other)
+
+            shift = 0 if j % 2 == 0 else 1
+            for i2, j2, a, b in (
+                (i + shift, j - 1, 0, 3),
+                (i + 1, j, 1, 4),
+                (i + shift, j + 1, 2, 5)
+            ):
+                edge = len(edge_cells)
+                edge_cells.append([index])
+                cell_edges[index][a] = edge
+                other = cell_at(i2, j2)
+                if other is not None:
+                    cell_edges[other][b] = edge
+                    edge_cells[edge].append(other)
+
+        self.hex_vertices = {h: tuple(cell_vertices[c]) for c, h in cells.items()}
+        self.hex_edges = {h: tuple(cell_edges[c]) for c, h in cells.items()}
+        self.vertex_hexes = tuple(
+            tuple(cells[c] for c in vc if c in cells) for vc in vertex_cells
+        )
+        self.edge_hexes = tuple(
+            tuple(cells[c] for c in ec if c in cells) for ec in edge_cells
+        )
+
+        edge_vertices = [()] * len(edge_cells)
+        for index, edges in cell_edges.items():
+            for node, edge in enumerate(edges):
+                if edge is None or edge_vertices[edge]:
+                    continue
+                ends = (cell_vertices[index][node], cell_vertices[index][(node + 1) % 6])
+                if None not in ends:
+                    edge_vertices[edge] = ends
+
+        vertex_edges = [[] for _ in vertex_cells]
+        for edge, ends in enumerate(edge_vertices):
+            for vertex in ends:
+                vertex_edges[vertex].append(edge)
+
+        self.edge_vertices = tuple(edge_vertices)
+        self.vertex_edges = tuple(tuple(e) for e in vertex_edges)
+        self.vertex_neighbors = tuple(
+            tuple(v for e in edges for v in self.edge_vertices[e] if v != vertex)
+            for vertex, edges in enumerate(self.vertex_edges)
+        )
+        # Whether a piece may be built there: at least one land hex touches it
+        land = set(self.land)
+        self.vertex_on_land = tuple(any(h in land for h in hexes) for hexes in self.vertex_hexes)
+        self.edge_on_land = tuple(any(h in land for h in hexes) for hexes in self.edge_hexes)
+        self.hex_neighbors = {
+            h: tuple(
+                other for e in edges if e is not None
+                for other in self.edge_hexes[e] if other != h
+            )
+            for h, edges in self.hex_edges.items()
+        }
+
+    @property
+    def num_vertices(self):
+        return len(self.vertex_hexes)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_hexes)
+
+    def vertex(self, hex_id, node):
+        if isinstance(node, str):
+            node = NODE_INDEX[node]
+        return self.hex_vertices[int(hex_id)][node]
+
+    def edge(self, hex_id, node):
+        if isinstance(node, str):
+            node = NODE_INDEX[node]
+        return self.hex_edges[int(hex_id)][node]
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def compile(cls, width, mask):
+        return cls(width, mask)
+
+
+class Board:
+
+    def __init__(self, layout, cells, harbors):
+        self.layout = layout
+        width = len(get_layout(layout)['grid'][0])
+        mask = ''.join('X' if c[0] == 'X' else 'W' if c[0] == 'W' else 'L' for c in cells)
+        self.topology = topology = Topology.compile(width, mask)
+
+        self.resources = {}
+        self.chits = {}
+        self.desert = None
+        for index, hex_id in topology.cell_hex.items():
+            resource, chit = cells[index][0], int(cells[index][1], 16)
+            self.resources[hex_id] = resource
+            if chit:
+                self.chits.setdefault(chit, []).append(hex_id)
+            if resource == 'D':
+                self.desert = hex_id
+
+        self.harbors = {}
+        for location, resource in harbors.items():
+            hex_id, node = int(location[:-1]), NODE_INDEX[location[-1]]
+            for n in (node, (node + 1) % 6):
+                self.harbors[topology.vertex(hex_id, n)] = resource
+
+    @classmethod
+    def for_game(cls, game):
+        return cls(*board_data(game))
@@ -0,0 +1,182 @@
+"""
+Content-hashed bundles of the game client's ES modules.
+
+``app.js`` imports six other modules, which a browser only discovers one
+level at a time. ``build`` concatenates the whole import graph into a single
+module named after its content hash, and records which modules it contains in
+a manifest. The ``settlers_assets`` template tags then import the bundle and
+emit a ``modulepreload`` hint for it. Without a built bundle they fall back to
+the separate modules, with a hint for every module in the graph so they are
+still fetched in parallel.
+
+Bundle names change with their content, so they can be served with a long
+``Cache-Control: max-age`` and ``immutable``; for WhiteNoise, point
+``WHITENOISE_IMMUTABLE_FILE_TEST`` at ``immutable_file_test``.
+"""
+import hashlib
+import json
+import posixpath
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+ENTRIES = ('settlers/js/app.js',)
+DIST = 'settlers/js/dist'
+MANIFEST = f'{DIST}/manifest.json'
+STATIC_DIR = Path(__file__).parent / 'static'
+
+IMPORT_RE = re.compile(r'^import\s*\{([^}]*)\}\s*from\s*[\'"]([^\'"]+)[\'"];?[ \t]*\n?', re.M)
+OTHER_IMPORT_RE = re.compile(r'^import\b', re.M)
+EXPORT_LIST_RE = re.compile(r'^export\s*\{([^}]*)\};?[ \t]*\n?', re.M)
+EXPORT_DECL_RE = re.compile(r'^export\s+(?=(?:const|let|var|class|function|async)\b)', re.M)
+DECL_RE = re.compile(r'^(export\s+)?(?:const|let|var|class|(?:async\s+)?function\*?)\s+([\w$]+)', re.M)
+HASHED_RE = re.compile(r'\.[0-9a-f]{12}\.js$')
+
+
+class BundleError(Exception):
+    pass
+
+
+def names(spec):
+    found = [name.strip() for name in spec.split(',') if name.strip()]
+    for name in found:
+        if not re.fullmatch(r'[\w$]+', name):
+            raise BundleError(f'Unsupported import or export of {name!r}')
+    return found
+
+
+def read(path):
+    filename = finders.find(path)
+    if not filename:
+        raise BundleError(f'Static file {path} not found')
+    return Path(filename).read_text(encoding='utf-8')
+
+
+def module_graph(entry):
+    """
+    The static paths of ``entry`` and every module it imports, in an order
+    where each module follows its imports.
+    """
+    order = []
+    visiting = set()
+
+    def visit(path):
+        if path in order:
+            return
+        if path in visiting:
+            raise BundleError(f'Import cycle through {path}')
+
+        visiting.add(path)
+        for spec, target in IMPORT_RE.findall(read(path)):
+            visit(posixpath.normpath(posixpath.join(posixpath.dirname(path), target)))
+        visiting.discard(path)
+        order.append(path)
+
+    visit(entry)
+    return order
+
+
+def concatenate(paths):
+    """
+    One module with the code of the modules ``paths``, which must already be
+    in dependency order, exporting everything they export.
+    """
+    declared = {}
+    exports = []
+    parts = []
+    for path in paths:
+        source = read(path)
+        for spec, target in IMPORT_RE.findall(source):
+            names(spec)
+        source = IMPORT_RE.sub('', source)
+        if OTHER_IMPORT_RE.search(source):
+            raise BundleError(f'{path} has an import the bundler cannot inline')
+
+        for exported, name in DECL_RE.findall(source):
+            if name in declared:
+                raise BundleError(f'{name} is declared in both {declared[name]} and {path}')
+            declared[name] = path
+            if exported:
+                exports.append(name)
+
+        for spec in EXPORT_LIST_RE.findall(source):
+            exports.extend(names(spec))
+        source = EXPORT_LIST_RE.sub('', source)
+        source = EXPORT_DECL_RE.sub('', source)
+        parts.append(f'// {path}\n{source.strip()}\n')
+
+    exports = sorted(set(exports))
+    parts.append(f'export {{ {", ".join(exports)} }};\n')
+    return '\n'.join(parts)
+
+
+def build(output=STATIC_DIR, entries=ENTRIES):
+    """
+    Write a bundle for each of ``entries`` and the manifest under ``DIST`` in
+    the static directory ``output``, replacing any earlier build. Returns the
+    manifest, mapping each bundled module to its bundle.
+    """
+    dist = Path(output) / DIST
+    dist.mkdir(parents=True, exist_ok=True)
+    bundles = {}
+    for entry in entries:
+        paths = module_graph(entry)
+        code = concatenate(paths).encode('utf-8')
+        digest = hashlib.sha256(code).hexdigest()[:12]
+        name = f'{DIST}/{posixpath.splitext(posixpath.basename(entry))[0]}.{digest}.js'
+        (Path(output) / name).write_bytes(code)
+        bundles[name] = paths
+
+    for stale in dist.glob('*.js'):
+        if f'{DIST}/{stale.name}' not in bundles:
+            stale.unlink()
+
+    modules = {path: name for name, paths in bundles.items() for path in paths}
+    (Path(output) / MANIFEST).write_text(json.dumps(modules, indent=2, sort_keys=True) + '\n')
+    load_manifest.cache_clear()
+    cached_graph.cache_clear()
+    return modules
+
+
+def _load_manifest():
+    filename = finders.find(MANIFEST)
+    return json.loads(Path(filename).read_text(encoding='utf-8')) if filename else {}
+
+
+load_manifest = lru_cache(maxsize=None)(_load_manifest)
+cached_graph = lru_cache(maxsize=None)(module_graph)
+
+
+def manifest():
+    # Pick up a rebuilt bundle or edited module without a restart while developing
+    return _load_manifest() if settings.DEBUG else load_manifest()
+
+
+def resolve(module):
+    """
+    The static path to import the names of ``module`` from.
+    """
+    return manifest().get(module, module)
+
+
+def preloads(modules):
+    """
+    The static paths to preload for ``modules``: their bundles, or every
+    module they import when they are not bundled.
+    """
+    bundled = manifest()
+    paths = []
+    for module in modules:
+        if module in bundled:
+            graph = [bundled[module]]
+        else:
+            graph = module_graph(module) if settings.DEBUG else cached_graph(module)
+        paths.extend(path for path in graph if path not in paths)
+    return paths
+
+
+def immutable_file_test(path, url):
+    return f'/{DIST}/' in url and bool(HASHED_RE.search(url))
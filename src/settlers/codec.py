@@ -0,0 +1,246 @@
+"""
+Versioned compact storage for the JSON columns.
+
+Values are written as ``j1:<json>`` or, when compression is enabled and the
+JSON is long enough, ``z1:<base64 zlib json>``. Before serializing, games pack
+list-of-rows grids into a single string and turns/actions into short lists.
+Columns still holding plain JSON are read as before, so rows can be
+re-encoded at leisure with ``settlers_reencode``.
+
+``GameField`` is also lazy: the column text is kept as loaded and decoded on
+first access (with ``orjson`` when it is installed), and a model save leaves
+the column out entirely when the value was never touched or still has the
+digest of what was loaded or last saved, so unchanged games are never
+re-encoded. The digest of a loaded value is only taken when it is saved. Note that ``.values('game')`` returns the undecoded ``RawJSON``.
+"""
+import base64
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import expressions
+from django.db.models.query_utils import DeferredAttribute
+from django_extensions.db.fields.json import JSONField
+
+try:
+    from orjson import OPT_NON_STR_KEYS, dumps as orjson_dumps, loads as json_loads
+except ImportError:  # pragma: no cover
+    orjson_dumps = None
+    json_loads = json.loads
+
+VERSION = 1
+COMPRESS_MIN = 512
+PLAIN = f'j{VERSION}:'
+COMPRESSED = f'z{VERSION}:'
+
+TURN_KEYS = ('roll', 'color', 'actions', 'played')
+BUILD_TYPES = {'road': 'r', 'settlement': 's', 'city': 'c'}
+BUILD_CODES = {code: kind for kind, code in BUILD_TYPES.items()}
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def dumps(value, compress=None):
+    text = _encoder.encode(value)
+    if compress is None:
+        compress = getattr(settings, 'SETTLERS_COMPRESS_JSON', True)
+
+    if compress and len(text) >= COMPRESS_MIN:
+        data = zlib.compress(text.encode(), 6)
+        return COMPRESSED + base64.b64encode(data).decode('ascii')
+
+    return PLAIN + text
+
+
+def digest(value):
+    """
+    A digest of ``value`` to tell whether it was changed in place; it is
+    neither packed nor compressed, and never stored.
+    """
+    if orjson_dumps is not None:
+        text = orjson_dumps(value, default=_encoder.default, option=OPT_NON_STR_KEYS)
+    else:
+        text = _encoder.encode(value).encode()
+    return hashlib.blake2b(text, digest_size=16).digest()
+
+
+def loads(text):
+    prefix = text[:3]
+    if prefix == COMPRESSED:
+        return json_loads(zlib.decompress(base64.b64decode(text[3:])))
+    if prefix == PLAIN:
+        return json_loads(text[3:])
+
+    # Rows written before the codec existed
+    return json_loads(text)
+
+
+def pack_actions(actions):
+    return [
+        [BUILD_TYPES[a['type']], a['hex'], a['node']]
+        if len(a) == 3 and a.get('type') in BUILD_TYPES and 'hex' in a and 'node' in a
+        else a
+        for a in actions
+    ]
+
+
+def unpack_actions(actions):
+    return [
+        {'type': BUILD_CODES[a[0]], 'hex': a[1], 'node': a[2]} if isinstance(a, list) else a
+        for a in actions
+    ]
+
+
+def pack_turn(turn):
+    if len(turn) == 4 and all(key in turn for key in TURN_KEYS):
+        return [turn['roll'], turn['color'], pack_actions(turn['actions']), turn['played']]
+    return turn
+
+
+def unpack_turn(turn):
+    if isinstance(turn, list):
+        roll, color, actions, played = turn
+        return {'roll': roll, 'color': color, 'actions': unpack_actions(actions), 'played': played}
+    return turn
+
+
+def pack_game(game):
+    packed = dict(game)
+    grid = game.get('grid')
+    if (
+        isinstance(grid, list) and grid and
+        all(isinstance(row, list) and len(row) == len(grid[0]) for row in grid) and
+        all(isinstance(cell, str) and len(cell) == 2 for row in grid for cell in row)
+    ):
+        packed['grid'] = {'w': len(grid[0]), 'c': ''.join(cell for row in grid for cell in row)}
+
+    if isinstance(game.get('turns'), list):
+        packed['turns'] = [pack_turn(turn) for turn in game['turns']]
+    return packed
+
+
+def unpack_game(game):
+    grid = game.get('grid')
+    if isinstance(grid, dict):
+        cells = [grid['c'][i:i + 2] for i in range(0, len(grid['c']), 2)]
+        width = grid['w']
+        game['grid'] = [cells[i:i + width] for i in range(0, len(cells), width)]
+
+    if isinstance(game.get('turns'), list):
+        game['turns'] = [unpack_turn(turn) for turn in game['turns']]
+    return game
+
+
+class CompactJSONField(JSONField):
+    """
+    ``JSONField`` stored through ``dumps``/``loads``, with optional packing.
+    """
+
+    def pack(self, value):
+        return value
+
+    def unpack(self, value):
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, str) and value:
+            value = self.unpack(loads(value))
+        return super().to_python(value)
+
+    def get_db_prep_save(self, value, connection, **kwargs):
+        if value is None and self.null:
+            return None
+
+        if not isinstance(value, (str, expressions.Expression)):
+            value = dumps(self.pack(value))
+
+        return super().get_db_prep_save(value, connection)
+
+
+class RawJSON(str):
+    """
+    Column text as loaded from the database, not decoded yet.
+    """
+
+
+class LazyJSONAttribute(DeferredAttribute):
+    """
+    Decode the loaded ``RawJSON`` on first access, keeping the text so the
+    field can later tell whether the value changed.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, RawJSON):
+            data = instance.__dict__
+            data[self.field.digest_attname] = value
+            value = data[self.field.attname] = self.field.to_python(str(value))
+        return value
+
+    def __set__(self, instance, value):
+        data = instance.__dict__
+        data[self.field.attname] = value
+        data.pop(self.field.digest_attname, None)
+
+
+class GameField(CompactJSONField):
+    descriptor_class = LazyJSONAttribute
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        self.digest_attname = f'_{self.attname}_digest'
+
+    def pack(self, value):
+        return pack_game(value) if isinstance(value, dict) else value
+
+    def unpack(self, value):
+        return unpack_game(value) if isinstance(value, dict) else value
+
+    def from_db_value(self, value, expression, connection):
+        return RawJSON(value) if value else self.to_python(value)
+
+    def is_changed(self, instance):
+        """
+        Whether ``instance`` holds a value other than the one it was loaded
+        with or last saved.
+        """
+        data = instance.__dict__
+        value = data.get(self.attname)
+        if isinstance(value, RawJSON) or self.attname not in data:
+            return False
+
+        saved = data.get(self.digest_attname)
+        if isinstance(saved, RawJSON):
+            # Decoded again rather than on every read, as most reads never save
+            saved = data[self.digest_attname] = digest(self.to_python(str(saved)))
+        return saved is None or digest(value) != saved
+
+    def mark_saved(self, instance):
+        """
+        Record the value of ``instance`` as the one in the database, after it
+        was written by a queryset ``update``.
+        """
+        data = instance.__dict__
+        value = data.get(self.attname)
+        if self.attname in data and not isinstance(value, RawJSON):
+            data[self.digest_attname] = digest(value)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, RawJSON):
+            return value
+
+        # Later saves compare against what this one writes
+        self.mark_saved(model_instance)
+        return super().pre_save(model_instance, add)
+
+
+class ActionsField(CompactJSONField):
+
+    def pack(self, value):
+        return pack_actions(value) if isinstance(value, list) else value
+
+    def unpack(self, value):
+        return unpack_actions(value) if isinstance(value, list) else value
@@ -0,0 +1,105 @@
+"""
+Live game update notifiers used by the ``game_events`` streaming view.
+
+A notifier provides ``publish(pk, event)``, called from the model save paths,
+and ``subscribe(pk)``, an async context manager yielding an object whose
+``get()`` coroutine waits for the next event for that game. The backend is
+chosen with the ``SETTLERS_NOTIFIER`` setting.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_NOTIFIER = 'settlers.events.Broadcaster'
+
+
+class Broadcaster:
+    """
+    In-process fan-out to asyncio queues. Only viewers connected to the same
+    process as the writer are woken.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, pk, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(pk, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's event loop has already closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, pk):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self.lock:
+            self.subscribers.setdefault(pk, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self.lock:
+                self.subscribers[pk].discard(entry)
+                if not self.subscribers[pk]:
+                    del self.subscribers[pk]
+
+
+class PollingSubscription:
+
+    def __init__(self, pk, interval):
+        self.pk = pk
+        self.interval = interval
+        self.version = None
+
+    async def current_version(self):
+        from .models import Settlers
+
+        return await sync_to_async(
+            Settlers.objects.filter(pk=self.pk).values_list('version', flat=True).first
+        )()
+
+    async def get(self):
+        if self.version is None:
+            self.version = await self.current_version()
+
+        while True:
+            await asyncio.sleep(self.interval)
+            version = await self.current_version()
+            if version != self.version:
+                self.version = version
+                return {'type': 'update', 'version': version}
+
+
+class PollingNotifier:
+    """
+    Stand-in for a pub/sub backend when viewers and writers run in different
+    processes: each subscription watches the game's ``version`` column.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+
+    def publish(self, pk, event):
+        pass
+
+    @asynccontextmanager
+    async def subscribe(self, pk):
+        yield PollingSubscription(pk, self.interval)
+
+
+@lru_cache(maxsize=None)
+def get_notifier():
+    return import_string(getattr(settings, 'SETTLERS_NOTIFIER', DEFAULT_NOTIFIER))()
+
+
+def publish(pk, event):
+    get_notifier().publish(pk, event)
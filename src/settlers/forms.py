@@ -1,7 +1,11 @@
 import json
 import random
 from django import forms
-from .models import Settlers
+from django.db import transaction
+from . import generator
+from .models import Settlers, SettlersBoard
+from .replay import ReplayError
+from .validate import validate_turn
 
 
 class SubmitError(Exception):
@@ -16,8 +20,23 @@ class JSONField(forms.CharField):
         return json.loads(value) if value else value
 
 
+def fair_board(layout):
+    """
+    Take a board from the pre-generated pool, generating one on demand when the
+    pool is empty.
+    """
+    board = SettlersBoard.take(layout)
+    if board is None:
+        board = generator.generate_boards(layout, 1)[0]
+    return board
+
+
 class SettlersNewGameForm(forms.ModelForm):
-    game = JSONField()
+    game = JSONField(required=False)
+    fair_board = forms.BooleanField(
+        required=False,
+        help_text='Use a server-generated board with balanced numbers'
+    )
 
     class Meta:
         model = Settlers
@@ -30,30 +49,40 @@ class SettlersNewGameForm(forms.ModelForm):
         }
 
     def save(self):
-        instance = super().save()
-        player_profiles = list(instance.player_profiles.all())
-        random.shuffle(player_profiles)
-
-        colors = ['red', 'blue', 'orange', 'white']
-        if len(player_profiles) > 4:
-            colors.extend(['green', 'brown'])
-        random.shuffle(colors)
-
-        players = []
-        for profile in player_profiles:
-            player_color = None
-            if profile.favorite_colors:
-                for color in profile.favorite_colors.split(','):
-                    if color in colors:
-                        player_color = color
-                        break
-            player_color = player_color or colors[0]
-            players.append({'id': profile.user.id, 'name': str(profile), 'color': player_color})
-            colors.remove(player_color)
-
-        instance.game['players'] = players
-        instance.game['turns'] = []
-        instance.save()
+        with transaction.atomic():
+            if self.cleaned_data.get('fair_board'):
+                # Taken only now, so an invalid form leaves the pool alone
+                layout = self.instance.game.get('layout', 'standard34')
+                try:
+                    self.instance.game = fair_board(layout)
+                except ImportError:
+                    # The pool emptied after ``clean``; keep the client's board
+                    if not self.instance.game.get('grid'):
+                        raise
+            instance = super().save()
+            player_profiles = list(instance.player_profiles.all())
+            random.shuffle(player_profiles)
+
+            colors = ['red', 'blue', 'orange', 'white']
+            if len(player_profiles) > 4:
+                colors.extend(['green', 'brown'])
+            random.shuffle(colors)
+
+            players = []
+            for profile in player_profiles:
+                player_color = None
+                if profile.favorite_colors:
+                    for color in profile.favorite_colors.split(','):
+                        if color in colors:
+                            player_color = color
+                            break
+                player_color = player_color or colors[0]
+                players.append({'id': profile.user.id, 'name': str(profile), 'color': player_color})
+                colors.remove(player_color)
+
+            instance.game['players'] = players
+            instance.game.pop('turns', None)
+            instance.save()
         return instance
 
     def clean_player_profiles(self):
@@ -64,18 +93,52 @@ class SettlersNewGameForm(forms.ModelForm):
 
         return player_profiles
 
+    def clean(self):
+        cleaned_data = super().clean()
+        game = cleaned_data.get('game')
+        if cleaned_data.get('fair_board'):
+            # ``save`` replaces this with a board from the pool
+            game = cleaned_data['game'] = game or {'layout': 'standard34'}
+            layout = game.get('layout', 'standard34')
+            if not generator.available() and not SettlersBoard.objects.filter(layout=layout).exists():
+                if game.get('grid'):
+                    cleaned_data['fair_board'] = False
+                else:
+                    self.add_error(
+                        'fair_board',
+                        'No fair boards are available; generate some with settlers_generate_boards.'
+                    )
+        elif not game:
+            self.add_error('game', 'This field is required.')
+
+        return cleaned_data
+
 
 class SettlersTurnForm(forms.ModelForm):
     turn = JSONField()
     trade = JSONField(required=False)
+    version = forms.IntegerField(required=False, widget=forms.HiddenInput)
 
     class Meta:
         model = Settlers
         fields = ['turn', 'trade']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'].initial = self.instance.version
+
     def clean(self):
-        turn = self.cleaned_data['turn']
-        if turn['roll'] != self.instance.game['nextRoll']:
+        version = self.cleaned_data.get('version')
+        if version is not None and version != self.instance.version:
+            raise SubmitError(409)
+
+        turn = self.cleaned_data.get('turn')
+        if not isinstance(turn, dict) or turn.get('roll') != self.instance.next_roll:
+            raise SubmitError(400)
+
+        try:
+            validate_turn(self.instance, turn)
+        except ReplayError:
             raise SubmitError(400)
 
         return self.cleaned_data
@@ -0,0 +1,147 @@
+"""
+Vectorized generation of fair boards for the standard layouts.
+
+Boards are drawn in NumPy batches and rejected when a 6 or 8 sits next to
+another 6 or 8 (optionally: when any two neighbors share a number), when a
+single vertex is too rich, or when the pip totals of the five resources are
+too lopsided.
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .board import Topology
+from .layouts import RESOURCES, get_layout
+
+BATCH_SIZE = 4096
+MAX_EMPTY_BATCHES = 20
+MAX_VERTEX_PIPS = 12
+MAX_RESOURCE_SPREAD = 8
+
+# Pips (dots) printed on each chit, indexed by chit number
+PIPS = [0, 0, 1, 2, 3, 4, 5, 0, 5, 4, 3, 2, 1]
+
+
+class LayoutTables:
+    """
+    Index arrays for one layout: land hexes are numbered from 0 in hex id order.
+    """
+
+    def __init__(self, name):
+        layout = get_layout(name)
+        self.name = layout['name']
+        mask = ''.join(layout['grid'])
+        topology = Topology.compile(len(layout['grid'][0]), mask)
+        land = topology.land
+        size = len(land)
+
+        self.cells = [f'{kind}0' for kind in mask]
+        self.land_cells = [topology.hex_cell[h] for h in land]
+        self.pairs = np.array(sorted({
+            (a - 1, b - 1)
+            for a in land
+            for b in topology.hex_neighbors[a]
+            if a < b and b <= size
+        }))
+
+        # Land hexes around each land vertex, padded with the ``size`` sentinel
+        vertices = {
+            tuple(h - 1 for h in hexes if h <= size)
+            for h in land
+            for hexes in (topology.vertex_hexes[v] for v in topology.hex_vertices[h])
+        }
+        self.vertices = np.array([v + (size,) * (3 - len(v)) for v in vertices])
+
+        self.terrain = np.array([k for k, n in layout['terrain'].items() for _ in range(n)])
+        self.chits = np.array(layout['chits'])
+        self.harbors = layout['harbors']
+        self.size = size
+
+    def random_batch(self, rng, count):
+        terrain = self.terrain[np.argsort(rng.random((count, self.size)), axis=1)]
+        numbered = len(self.chits)
+        positions = np.argsort(terrain == 'D', axis=1, kind='stable')[:, :numbered]
+        chits = np.zeros((count, self.size), dtype=int)
+        np.put_along_axis(
+            chits,
+            positions,
+            self.chits[np.argsort(rng.random((count, numbered)), axis=1)],
+            axis=1
+        )
+        return terrain, chits
+
+    def valid(self, terrain, chits, max_vertex_pips, max_resource_spread, distinct_neighbors):
+        a, b = self.pairs.T
+        red = (chits == 6) | (chits == 8)
+        ok = ~(red[:, a] & red[:, b]).any(axis=1)
+        if distinct_neighbors:
+            ok &= ~((chits[:, a] == chits[:, b]) & (chits[:, a] > 0)).any(axis=1)
+
+        pips = np.array(PIPS)[chits]
+        padded = np.concatenate([pips, np.zeros((len(pips), 1), dtype=int)], axis=1)
+        ok &= padded[:, self.vertices].sum(axis=2).max(axis=1) <= max_vertex_pips
+
+        totals = np.stack([(pips * (terrain == r)).sum(axis=1) for r in RESOURCES], axis=1)
+        ok &= totals.max(axis=1) - totals.min(axis=1) <= max_resource_spread
+        return ok
+
+    def encode(self, terrain, chits, rng):
+        cells = list(self.cells)
+        for index, cell in enumerate(self.land_cells):
+            cells[cell] = f'{terrain[index]}{chits[index]:x}'
+
+        resources = rng.permutation(list(self.harbors.values()))
+        return {
+            'layout': self.name,
+            'grid': ''.join(cells),
+            'harbors': dict(zip(self.harbors, map(str, resources))),
+        }
+
+
+def available():
+    return np is not None
+
+
+@lru_cache(maxsize=None)
+def layout_tables(name):
+    if np is None:
+        raise ImportError('Board generation requires numpy')
+    return LayoutTables(name)
+
+
+def generate_boards(
+    layout,
+    count,
+    seed=None,
+    max_vertex_pips=MAX_VERTEX_PIPS,
+    max_resource_spread=MAX_RESOURCE_SPREAD,
+    distinct_neighbors=False
+):
+    """
+    Return ``count`` fair boards as ``{'layout', 'grid', 'harbors'}`` dicts,
+    the format ``Board.export()`` in ``models/board.js`` produces.
+    """
+    tables = layout_tables(layout)
+    rng = np.random.default_rng(seed)
+    boards = []
+    empty = 0
+    while len(boards) < count:
+        terrain, chits = tables.random_batch(rng, BATCH_SIZE)
+        ok = np.flatnonzero(tables.valid(
+            terrain,
+            chits,
+            max_vertex_pips,
+            max_resource_spread,
+            distinct_neighbors
+        ))
+        empty = 0 if len(ok) else empty + 1
+        if empty >= MAX_EMPTY_BATCHES:
+            raise ValueError(f'Constraints too strict: only {len(boards)} board(s) found')
+
+        for index in ok[:count - len(boards)]:
+            boards.append(tables.encode(terrain[index], chits[index], rng))
+
+    return boards
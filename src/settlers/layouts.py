@@ -0,0 +1,85 @@
+# Python mirror of the layout definitions in static/settlers/js/common.js
+
+RESOURCES = 'BOSTG'
+DEV_CARDS = ('KN', 'MP', 'RB', 'VP', 'YP')
+
+PURCHASE = {
+    'settlement': (('B', 1), ('T', 1), ('G', 1), ('S', 1)),
+    'road': (('B', 1), ('T', 1)),
+    'city': (('G', 2), ('O', 3)),
+    'development': (('S', 1), ('G', 1), ('O', 1)),
+}
+
+LAYOUTS = {
+    'standard34': {
+        'name': 'standard34',
+        'pointsToWin': 10,
+        'terrain': {'D': 1, 'T': 4, 'O': 3, 'B': 3, 'G': 4, 'S': 4},
+        'constructs': {'city': 4, 'settlement': 5, 'road': 15},
+        'resourceCards': {'O': 19, 'G': 19, 'T': 19, 'S': 19, 'B': 19},
+        'developmentCards': {'KN': 14, 'RB': 2, 'MP': 2, 'YP': 2, 'VP': 5},
+        'grid': [
+            'XXWWWWX',
+            'XWLLLWX',
+            'XWLLLLW',
+            'WLLLLLW',
+            'XWLLLLW',
+            'XWLLLWX',
+            'XXWWWWX',
+        ],
+        'chits': [2, 3, 3, 4, 4, 5, 5, 6, 6, 8, 8, 9, 9, 10, 10, 11, 11, 12],
+        'harbors': {
+            '1f': '3',
+            '2a': 'B',
+            '4e': 'O',
+            '7a': '3',
+            '12b': 'S',
+            '13e': 'G',
+            '16c': '3',
+            '17d': '3',
+            '18c': 'T',
+        },
+    },
+    'standard56': {
+        'name': 'standard56',
+        'pointsToWin': 10,
+        'terrain': {'D': 2, 'T': 6, 'O': 5, 'B': 5, 'G': 6, 'S': 6},
+        'constructs': {'city': 4, 'settlement': 5, 'road': 15},
+        'resourceCards': {'O': 24, 'G': 24, 'T': 24, 'S': 24, 'B': 24},
+        'developmentCards': {'KN': 20, 'RB': 3, 'MP': 3, 'YP': 3, 'VP': 5},
+        'grid': [
+            'XXWWWWXXX',
+            'XWLLLWXXX',
+            'XWLLLLWXX',
+            'WLLLLLWXX',
+            'WLLLLLLWX',
+            'WLLLLLWXX',
+            'XWLLLLWXX',
+            'XWLLLWXXX',
+            'XXWWWWXXX',
+        ],
+        'chits': [
+            2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 5, 6, 6, 6,
+            8, 8, 8, 9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12
+        ],
+        'harbors': {
+            '1f': '3',
+            '2a': 'B',
+            '7a': 'O',
+            '8e': '3',
+            '13d': 'S',
+            '18b': 'G',
+            '23c': '3',
+            '24e': '3',
+            '28d': 'T',
+            '29c': 'S',
+            '30b': '3',
+        },
+    },
+}
+
+DEFAULT_LAYOUT = 'standard34'
+
+
+def get_layout(name):
+    return LAYOUTS.get(name or DEFAULT_LAYOUT, LAYOUTS[DEFAULT_LAYOUT])
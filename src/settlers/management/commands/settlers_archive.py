@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from settlers.models import Settlers, SettlersArchive
+
+
+class Command(BaseCommand):
+    help = 'Move finished games, and optionally long-idle ones, into the compressed archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            help='Also archive unfinished games not updated for IDLE_DAYS days'
+        )
+        parser.add_argument(
+            '--restore',
+            type=int,
+            nargs='+',
+            metavar='PK',
+            help='Move these archived games back so they can be played again'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            for pk in options['restore']:
+                if SettlersArchive.restore(pk):
+                    self.stdout.write(f'Restored game {pk}')
+                else:
+                    self.stderr.write(f'Game {pk} is not archived')
+            return
+
+        archivable = Q(is_finished=True)
+        if options['idle_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['idle_days'])
+            archivable |= Q(updated__lt=cutoff)
+        candidates = Settlers.objects.filter(archivable).exclude(pk=1)
+
+        if options['dry_run']:
+            self.stdout.write(f'Would archive {candidates.count()} game(s)')
+            return
+
+        count = 0
+        for pk in list(candidates.order_by('pk').values_list('pk', flat=True)):
+            # Re-checked under the row lock, in case a player saved meanwhile
+            if SettlersArchive.archive(pk, candidates):
+                count += 1
+        self.stdout.write(f'Archived {count} game(s)')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from settlers.models import Settlers, StaleGameError
+
+
+class Command(BaseCommand):
+    help = 'Move turns embedded in the Settlers.game JSON into the SettlersTurn log'
+
+    def handle(self, *args, **options):
+        games = turns = 0
+        # The game column may be compressed, so look for embedded turns in Python
+        for game in Settlers.objects.iterator(chunk_size=200):
+            if 'turns' not in game.game:
+                continue
+
+            try:
+                count = game.migrate_turns()
+            except StaleGameError:
+                # Saved by a player while we were working; its next turn migrates it
+                continue
+
+            if count:
+                games += 1
+                turns += count
+
+        self.stdout.write(f'Moved {turns} turn(s) from {games} game(s)')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from settlers.bundle import STATIC_DIR, BundleError, build
+
+
+class Command(BaseCommand):
+    help = 'Bundle the Settlers client modules into content-hashed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=STATIC_DIR,
+            help='Static directory to write settlers/js/dist into, before collectstatic'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            modules = build(options['output'])
+        except BundleError as why:
+            raise CommandError(why)
+
+        for bundle in sorted(set(modules.values())):
+            count = sum(1 for name in modules.values() if name == bundle)
+            self.stdout.write(f'{bundle}: {count} module(s)')
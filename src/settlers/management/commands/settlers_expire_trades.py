@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from settlers.trades import expire_trades
+
+
+class Command(BaseCommand):
+    help = 'Close Settlers trade offers that have expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, sweeping every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = expire_trades(options['batch_size'])
+            if count:
+                self.stdout.write(f'Expired {count} trade offer(s)')
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
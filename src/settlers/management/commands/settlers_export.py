@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from settlers import ndjson
+
+
+class Command(BaseCommand):
+    help = 'Stream live and archived Settlers games, with their turns and players, as newline-delimited JSON'
+
+    def add_arguments(self, parser):
+        ndjson.add_arguments(parser)
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with ndjson.open_stream(options, 'w') as stream:
+            count = ndjson.export_games(stream, ndjson.from_options(options), options['chunk_size'])
+        self.stderr.write(f'Exported {count} game(s)')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from settlers.generator import MAX_RESOURCE_SPREAD, MAX_VERTEX_PIPS, generate_boards
+from settlers.layouts import LAYOUTS
+from settlers.models import SettlersBoard
+
+
+class Command(BaseCommand):
+    help = 'Fill the pool of pre-generated fair boards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layout', choices=sorted(LAYOUTS), default='standard34')
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--max-vertex-pips', type=int, default=MAX_VERTEX_PIPS)
+        parser.add_argument('--max-resource-spread', type=int, default=MAX_RESOURCE_SPREAD)
+        parser.add_argument(
+            '--distinct-neighbors',
+            action='store_true',
+            help='Also reject boards where neighboring hexes share a number'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            boards = generate_boards(
+                options['layout'],
+                options['count'],
+                seed=options['seed'],
+                max_vertex_pips=options['max_vertex_pips'],
+                max_resource_spread=options['max_resource_spread'],
+                distinct_neighbors=options['distinct_neighbors']
+            )
+        except (ImportError, ValueError) as err:
+            raise CommandError(err)
+
+        SettlersBoard.objects.bulk_create(
+            [SettlersBoard(layout=options['layout'], board=board) for board in boards],
+            batch_size=500
+        )
+        self.stdout.write(f'Added {len(boards)} {options["layout"]} board(s) to the pool')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from settlers import ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Create Settlers games from a settlers_export newline-delimited JSON stream, '
+        'skipping games with a player who has no local profile'
+    )
+
+    def add_arguments(self, parser):
+        ndjson.add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--keep-ids',
+            action='store_true',
+            help='Insert games with their exported ids instead of new ones'
+        )
+
+    def handle(self, *args, **options):
+        with ndjson.open_stream(options, 'r') as stream:
+            count, unmatched = ndjson.import_games(
+                stream,
+                ndjson.from_options(options),
+                options['batch_size'],
+                options['keep_ids']
+            )
+
+        self.stdout.write(f'Imported {count} game(s)')
+        if unmatched:
+            self.stderr.write(f'Skipped games of players with no local profile: {", ".join(unmatched)}')
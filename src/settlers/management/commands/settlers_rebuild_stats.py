@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from settlers.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the Settlers statistics tables from the turn log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        count = rebuild(options['chunk_size'])
+        self.stdout.write(f'Rebuilt statistics for {count} game(s)')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from settlers.models import Settlers, SettlersSnapshot, SettlersTurn
+
+COLUMNS = ((Settlers, 'game'), (SettlersTurn, 'actions'), (SettlersSnapshot, 'state'))
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the JSON columns with the current settlers.codec encoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model, field in COLUMNS:
+            count = self.reencode(model, field, options['chunk_size'])
+            self.stdout.write(f'Re-encoded {count} {model._meta.verbose_name_plural}')
+
+    def reencode(self, model, field, chunk_size):
+        last_pk = count = 0
+        while True:
+            # Locked so that a concurrent write to the same row is not undone
+            with transaction.atomic():
+                rows = list(
+                    model.objects.select_for_update()
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .only('pk', field)[:chunk_size]
+                )
+                if not rows:
+                    return count
+
+                model.objects.bulk_update(rows, [field])
+
+            last_pk = rows[-1].pk
+            count += len(rows)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from settlers.outbox import send_outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued Settlers notification emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, polling the outbox every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_outbox(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} notification(s), {failed} failed')
+
+            if not options['interval']:
+                break
+
+            time.sleep(options['interval'])
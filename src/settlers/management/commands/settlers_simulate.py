@@ -0,0 +1,75 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from settlers.layouts import LAYOUTS
+from settlers.models import SettlersProfile
+from settlers.ndjson import import_batch
+from settlers.simulate import BOTS, simulate
+
+BOT_PLAYERS = 6
+
+
+class Command(BaseCommand):
+    help = 'Create Settlers games played to the end (or part way) by bots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--seed', default='0', help='Runs with the same seed create the same games')
+        parser.add_argument('--bot', choices=sorted(BOTS), default='greedy')
+        parser.add_argument('--layout', choices=sorted(LAYOUTS), default='standard34')
+        parser.add_argument(
+            '--unfinished',
+            type=float,
+            default=0.1,
+            help='Share of games stopped part way'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Play the games in a pool of WORKERS processes'
+        )
+
+    def handle(self, *args, **options):
+        play = partial(
+            simulate,
+            seed=options['seed'],
+            bot=options['bot'],
+            layout=options['layout'],
+            profiles=self.profiles(),
+            unfinished=options['unfinished'],
+            now=timezone.now()
+        )
+        count = options['count']
+        batch_size = options['batch_size']
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] > 1 else None
+        try:
+            for start in range(0, count, batch_size):
+                indexes = range(start, min(start + batch_size, count))
+                records = list(executor.map(play, indexes, chunksize=16) if executor else map(play, indexes))
+                import_batch(records)
+                self.stdout.write(f'{start + len(records)} game(s) created', ending='\r')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(f'Created {count} game(s); run settlers_rebuild_stats to count them')
+
+    def profiles(self):
+        """
+        Seat the existing players, adding bot players while there are fewer
+        than four.
+        """
+        User = get_user_model()
+        for n in range(1, BOT_PLAYERS + 1):
+            if SettlersProfile.objects.count() >= 4:
+                break
+            user, created = User.objects.get_or_create(username=f'bot{n}')
+            SettlersProfile.objects.get_or_create(user=user)
+
+        return list(SettlersProfile.objects.order_by('pk').values_list('user_id', 'user__username'))
@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from settlers.models import Settlers, SettlersCheckpoint
+from settlers.transforms import TRANSFORMS, apply
+
+
+class Command(BaseCommand):
+    help = 'Apply a registered transform to every Settlers.game, in resumable chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('transform', choices=sorted(TRANSFORMS))
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Run the transform in a pool of WORKERS processes'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint of a previous run'
+        )
+
+    def handle(self, *args, **options):
+        name = options['transform']
+        dry_run = options['dry_run']
+        checkpoint = (
+            SettlersCheckpoint.objects.filter(name=name).first() or
+            SettlersCheckpoint(name=name)
+        )
+        if options['restart'] or dry_run:
+            checkpoint.last_pk = checkpoint.processed = checkpoint.changed = 0
+            checkpoint.finished = None
+        elif checkpoint.finished:
+            self.stdout.write(f'{name} already finished; use --restart to run it again')
+            return
+
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] > 1 else None
+        transform = partial(apply, name)
+        try:
+            while self.run_chunk(checkpoint, transform, executor, options['chunk_size'], dry_run):
+                self.stdout.write(
+                    f'{checkpoint.processed} processed, {checkpoint.changed} changed',
+                    ending='\r'
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if not dry_run:
+            checkpoint.finished = timezone.now()
+            checkpoint.save()
+
+        verb = 'would change' if dry_run else 'changed'
+        self.stdout.write(f'{name}: {checkpoint.processed} game(s) processed, {verb} {checkpoint.changed}')
+
+    def run_chunk(self, checkpoint, transform, executor, chunk_size, dry_run):
+        """
+        Transform the next chunk of games and save it, with the checkpoint, in
+        one transaction. Rows are locked while the chunk is transformed so that
+        concurrent game writes are not lost.
+        """
+        with transaction.atomic():
+            games = list(
+                Settlers.objects.select_for_update()
+                .filter(pk__gt=checkpoint.last_pk)
+                .order_by('pk')
+                .only('pk', 'game')[:chunk_size]
+            )
+            if not games:
+                return False
+
+            data = [game.game for game in games]
+            results = executor.map(transform, data, chunksize=64) if executor else map(transform, data)
+            now = timezone.now()
+            changed = []
+            for game, result in zip(games, results):
+                if result is not None:
+                    game.game = result
+                    game.version = models.F('version') + 1
+                    game.updated = now
+                    changed.append(game)
+
+            checkpoint.last_pk = games[-1].pk
+            checkpoint.processed += len(games)
+            checkpoint.changed += len(changed)
+            if not dry_run:
+                Settlers.objects.bulk_update(changed, ['game', 'version', 'updated'])
+                checkpoint.save()
+
+        return True
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('state', django_extensions.db.fields.json.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('settlers', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='settlers.settlers')),
+            ],
+            options={
+                'unique_together': {('settlers', 'index')},
+            },
+        ),
+    ]
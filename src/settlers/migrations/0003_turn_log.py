@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import django_extensions.db.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0002_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('color', models.CharField(max_length=10)),
+                ('roll', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('actions', django_extensions.db.fields.json.JSONField(default=list)),
+                ('played', models.DateTimeField(default=django.utils.timezone.now)),
+                ('settlers', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turn_log', to='settlers.settlers')),
+            ],
+            options={
+                'ordering': ('settlers', 'index'),
+                'unique_together': {('settlers', 'index')},
+            },
+        ),
+    ]
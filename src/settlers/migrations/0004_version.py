@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0003_turn_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlers',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import django_extensions.db.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('settlers', '0004_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='turn', max_length=20)),
+                ('player', models.CharField(max_length=150)),
+                ('extras', django_extensions.db.fields.json.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('settlers', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='settlers.settlers')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sent', 'next_attempt'], name='settlers_se_sent_0d93bb_idx')],
+            },
+        ),
+    ]
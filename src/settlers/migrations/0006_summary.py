@@ -0,0 +1,90 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+def backfill_summary(apps, schema_editor):
+    Settlers = apps.get_model('settlers', 'Settlers')
+    SettlersTurn = apps.get_model('settlers', 'SettlersTurn')
+    for obj in Settlers.objects.iterator():
+        game = obj.game
+        players = game.get('players') or []
+        if 'turns' in game:
+            turns = game['turns']
+            n_turns = len(turns)
+            last = turns[-1] if turns else None
+        else:
+            log = SettlersTurn.objects.filter(settlers=obj)
+            n_turns = log.count()
+            last = log.order_by('-index').values('actions').first()
+
+        obj.turn_count = n_turns
+        obj.player_names = ', '.join(p['name'] for p in players)[:255]
+        obj.is_finished = bool(last) and any(a['type'] == 'win' for a in last['actions'])
+        if players:
+            n_players = len(players)
+            offset = n_turns % n_players
+            if n_players <= n_turns < n_players * 2:
+                offset = ~offset
+            active = players[offset]
+            obj.active_player_id = active['id']
+            obj.active_color = active['color']
+            obj.current_stage = (
+                'play' if n_turns >= n_players * 2 else
+                'init2' if n_turns >= n_players else
+                'init1'
+            )
+
+        obj.save(update_fields=[
+            'current_stage',
+            'turn_count',
+            'active_player_id',
+            'active_color',
+            'player_names',
+            'is_finished',
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0005_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlers',
+            name='active_color',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='settlers',
+            name='active_player_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='settlers',
+            name='current_stage',
+            field=models.CharField(db_index=True, default='init1', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='settlers',
+            name='is_finished',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='settlers',
+            name='player_names',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='settlers',
+            name='turn_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='settlers',
+            index=models.Index(fields=['-updated', '-id'], name='settlers_se_updated_a1b280_idx'),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:02
+
+from django.db import migrations, models
+import django_extensions.db.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0006_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersBoard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layout', models.CharField(db_index=True, max_length=20)),
+                ('board', django_extensions.db.fields.json.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
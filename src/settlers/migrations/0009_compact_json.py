@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:06
+
+from django.db import migrations
+import settlers.codec
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0008_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='settlers',
+            name='game',
+            field=settlers.codec.GameField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name='settlerssnapshot',
+            name='state',
+            field=settlers.codec.CompactJSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name='settlersturn',
+            name='actions',
+            field=settlers.codec.ActionsField(default=list),
+        ),
+    ]
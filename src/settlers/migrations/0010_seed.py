@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:09
+
+from django.db import migrations, models
+import settlers.models
+
+
+def reseed(apps, schema_editor):
+    # AddField gives every existing row the same default; give each its own
+    Settlers = apps.get_model('settlers', 'Settlers')
+    for pk in Settlers.objects.values_list('pk', flat=True).iterator():
+        Settlers.objects.filter(pk=pk).update(seed=settlers.models.new_seed())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0009_compact_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlers',
+            name='seed',
+            field=models.CharField(default=settlers.models.new_seed, editable=False, max_length=32),
+        ),
+        migrations.RunPython(reseed, migrations.RunPython.noop),
+    ]
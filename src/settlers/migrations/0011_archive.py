@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0010_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+                ('version', models.PositiveIntegerField()),
+                ('seed', models.CharField(max_length=32)),
+                ('current_stage', models.CharField(max_length=8)),
+                ('turn_count', models.PositiveIntegerField()),
+                ('active_player_id', models.IntegerField(blank=True, null=True)),
+                ('active_color', models.CharField(blank=True, max_length=10)),
+                ('player_names', models.CharField(blank=True, max_length=255)),
+                ('is_finished', models.BooleanField(default=False)),
+                ('payload', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:15
+
+from django.db import migrations, models
+import settlers.models
+
+
+def backfill(apps, schema_editor):
+    Settlers = apps.get_model('settlers', 'Settlers')
+    for obj in Settlers.objects.only('pk', 'game').iterator():
+        offers = obj.game.get('tradeOffers')
+        if offers:
+            Settlers.objects.filter(pk=obj.pk).update(
+                trade_expires_at=settlers.models.trade_expiry(offers)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0011_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlers',
+            name='trade_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
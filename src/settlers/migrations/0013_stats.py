@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import settlers.codec
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0012_trade_expiry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlersGameStats',
+            fields=[
+                ('settlers', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='settlers.settlers')),
+                ('turns_counted', models.PositiveIntegerField(default=0)),
+                ('rolls', settlers.codec.CompactJSONField(default=list)),
+                ('production', settlers.codec.CompactJSONField(default=dict)),
+                ('winner_color', models.CharField(blank=True, max_length=10)),
+                ('winner_seat', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Settlers game stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='SettlersStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=20)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+    ]
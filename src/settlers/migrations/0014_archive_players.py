@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:38
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Archived games recorded their players only in the compressed payload
+    SettlersArchive = apps.get_model('settlers', 'SettlersArchive')
+    SettlersProfile = apps.get_model('settlers', 'SettlersProfile')
+    for archive in SettlersArchive.objects.only('pk', 'payload').iterator():
+        game = json.loads(zlib.decompress(archive.payload))
+        user_ids = [player['id'] for player in game.get('players', [])]
+        archive.player_profiles.set(SettlersProfile.objects.filter(user_id__in=user_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settlers', '0013_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlersarchive',
+            name='player_profiles',
+            field=models.ManyToManyField(blank=True, to='settlers.settlersprofile'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
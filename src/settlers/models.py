@@ -1,24 +1,54 @@
-import random
+import hmac
+import json
+import secrets
+import zlib
 from datetime import timedelta
 
 from django.core import mail
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.template import loader
 from django.contrib.auth import get_user_model
 from django.utils.functional import cached_property
 
 from django_extensions.db.fields.json import JSONField
 
+from . import events
+from .codec import ActionsField, CompactJSONField, GameField
+from .replay import GameState, Replay
+
 User = get_user_model()
 TRADE_TIMEDELTA = timedelta(hours=12)
+SNAPSHOT_INTERVAL = getattr(settings, 'SETTLERS_SNAPSHOT_INTERVAL', 20)
+UPDATE_RETRIES = 5
 COLOR_CHOICES = 'blue red orange white brown green'.split()
 
 
-def random_roll():
-    return random.randint(1, 6) + random.randint(1, 6)
+class StaleGameError(Exception):
+    pass
+
+
+def new_seed():
+    return secrets.token_hex(16)
+
+
+def trade_expiry(offers):
+    expires = offers.get('expires')
+    return parse_datetime(expires) if isinstance(expires, str) else expires
+
+
+def seeded_roll(seed, index):
+    """
+    The two-dice roll for turn ``index`` of the game with ``seed``.
+    """
+    digest = hmac.new(seed.encode(), str(index).encode(), 'sha256').digest()
+    # 252 is the largest multiple of 6 below 256, so each die stays uniform
+    dice = [b % 6 + 1 for b in digest if b < 252]
+    return dice[0] + dice[1]
 
 
 class SettlersProfile(models.Model):
@@ -48,11 +78,73 @@ class Settlers(models.Model):
     player_profiles = models.ManyToManyField(SettlersProfile, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
-    game = JSONField()
+    version = models.PositiveIntegerField(default=0)
+    # Secret seed the dice rolls are derived from; see ``next_roll``
+    seed = models.CharField(max_length=32, default=new_seed, editable=False)
+    game = GameField()
+
+    # Denormalized from ``game`` so listings never need to decode it
+    current_stage = models.CharField(max_length=8, default='init1', db_index=True)
+    turn_count = models.PositiveIntegerField(default=0)
+    active_player_id = models.IntegerField(null=True, blank=True)
+    active_color = models.CharField(max_length=10, blank=True)
+    player_names = models.CharField(max_length=255, blank=True)
+    is_finished = models.BooleanField(default=False, db_index=True)
+    # Swept by ``settlers_expire_trades`` once past
+    trade_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    # Set on instances inflated from a ``SettlersArchive``, which are read-only
+    is_archived = False
+
+    SUMMARY_FIELDS = (
+        'current_stage',
+        'turn_count',
+        'active_player_id',
+        'active_color',
+        'player_names',
+        'is_finished',
+        'trade_expires_at',
+    )
 
     class Meta:
         verbose_name = "Settlers Game"
         verbose_name_plural = "Settlers Games"
+        indexes = [models.Index(fields=['-updated', '-id'])]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding or self._meta.get_field('game').is_changed(self):
+            self.update_summary()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.SUMMARY_FIELDS, 'version', 'updated'}
+            if not self._state.adding:
+                return self.save_versioned(*args, **kwargs)
+        else:
+            # Neither re-encode nor rewrite a game body that was not changed
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'game']
+        super().save(*args, **kwargs)
+
+    def save_versioned(self, *args, **kwargs):
+        """
+        Write a changed game with the same check and bump as ``save_game``, so
+        a concurrent turn is not overwritten and open pages see the change.
+        """
+        with transaction.atomic():
+            # Claiming the version also locks the row until the write below
+            claimed = Settlers.objects.filter(pk=self.pk, version=self.version).update(
+                version=models.F('version') + 1
+            )
+            if not claimed:
+                raise StaleGameError(self.pk)
+
+            self.version += 1
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version -= 1
+                raise
 
     def get_absolute_url(self):
         return reverse('settlers:demo') if self.id == 1 else reverse(
@@ -65,10 +157,41 @@ class Settlers(models.Model):
             if player['color'] == color:
                 return player
 
+    @cached_property
+    def turns(self):
+        if 'turns' in self.game:
+            return self.game['turns']
+
+        return [turn.as_turn() for turn in self.turn_log.all()] if self.pk else []
+
+    def count_turns(self):
+        # The stored count saves loading the turn log just to count it
+        if 'turns' in self.__dict__ or 'turns' in self.game or not self.pk:
+            return len(self.turns)
+        return self.turn_count
+
+    @cached_property
+    def last_turn(self):
+        if 'turns' in self.__dict__ or 'turns' in self.game or not self.pk:
+            return self.turns[-1] if self.turns else None
+
+        turn = self.turn_log.order_by('-index').first()
+        return turn.as_turn() if turn else None
+
+    def turns_since(self, index):
+        if not index or 'turns' in self.__dict__ or 'turns' in self.game:
+            return self.turns[index:]
+
+        return [turn.as_turn() for turn in self.turn_log.filter(index__gte=index)]
+
+    @property
+    def legacy_game(self):
+        return dict(self.game, turns=self.turns)
+
     @property
     def game_data(self):
         return dict(
-            self.game,
+            self.legacy_game,
             created=self.created,
             updated=self.updated
         )
@@ -76,7 +199,7 @@ class Settlers(models.Model):
     @property
     def stage(self):
         n_players = len(self.game['players'])
-        n_turns = len(self.game['turns'])
+        n_turns = self.count_turns()
 
         if n_turns >= n_players * 2:
             return 'play'
@@ -86,19 +209,49 @@ class Settlers(models.Model):
 
         return 'init1'
 
+    @property
+    def winner(self):
+        last_turn = self.last_turn
+        if last_turn:
+            for action in last_turn['actions']:
+                if action['type'] == 'win':
+                    return last_turn['color']
+        return None
+
+    def summary(self):
+        players = self.game.get('players') or []
+        active = self.active_player if players else None
+        offers = self.game.get('tradeOffers')
+        return {
+            'current_stage': self.stage if players else 'init1',
+            'turn_count': self.count_turns(),
+            'active_player_id': active['id'] if active else None,
+            'active_color': active['color'] if active else '',
+            'player_names': ', '.join(p['name'] for p in players)[:255],
+            'is_finished': self.winner is not None,
+            'trade_expires_at': trade_expiry(offers) if offers else None,
+        }
+
+    def update_summary(self):
+        for name, value in self.summary().items():
+            setattr(self, name, value)
+
     @property
     def is_sync(self):
         return self.game.get('isSync', True)
 
     @is_sync.setter
     def is_sync(self, value):
-        self.game['isSync'] = bool(value)
-        self.save()
+        def apply(game):
+            game['isSync'] = bool(value)
+            return True
+
+        self.update_game(apply)
 
     @property
     def active_player(self):
         game = self.game
-        n_turns = len(game['turns'])
+        n_turns = self.count_turns()
         n_players = len(game['players'])
 
         offset = n_turns % n_players
@@ -114,71 +267,533 @@ class Settlers(models.Model):
             )
         ]
 
-    def send_email(self, user, player, name='turn', extras=None):
-        extras = extras or {}
+    def email_message(self, user, player, name='turn', extras=None):
+        extras = dict(extras or {})
         extras.update({
             'game': self,
             'user': user,
             'player': player
         })
 
-        message = loader.render_to_string(f'settlers/emails/{name}.txt', extras)
-        html_message = loader.render_to_string(f'settlers/emails/{name}.html', {
+        message = mail.EmailMultiAlternatives(
+            f'Settlers game #{self.id} update',
+            loader.render_to_string(f'settlers/emails/{name}.txt', extras),
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email]
+        )
+        message.attach_alternative(loader.render_to_string(f'settlers/emails/{name}.html', {
             'game': self,
             'user': user,
             'player': player
-        })
+        }), 'text/html')
+        return message
 
-        mail.send_mail(
-            f'Settlers game #{self.id} update',
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message
+    def send_email(self, user, player, name='turn', extras=None):
+        self.email_message(user, player, name, extras).send()
+
+    def queue_notifications(self, exclude_id, player, name='turn', extras=None):
+        """
+        Add a notification to the outbox for every player other than
+        ``exclude_id``; ``settlers_send_outbox`` delivers them.
+        """
+        return SettlersNotification.objects.bulk_create([
+            SettlersNotification(
+                settlers=self,
+                user=user,
+                name=name,
+                player=player,
+                extras=extras or {}
+            )
+            for user in self.users_other_than(exclude_id)
+        ])
+
+    def reload(self):
+        self.refresh_from_db(fields=['game', 'version', 'updated'])
+        self.__dict__.pop('turns', None)
+        self.__dict__.pop('last_turn', None)
+
+    def save_game(self):
+        """
+        Write ``game`` only if the row still has the version we loaded.
+        """
+        now = timezone.now()
+        self.update_summary()
+        count = Settlers.objects.filter(pk=self.pk, version=self.version).update(
+            game=self.game,
+            version=models.F('version') + 1,
+            updated=now,
+            **{name: getattr(self, name) for name in self.SUMMARY_FIELDS}
         )
+        if not count:
+            raise StaleGameError(self.pk)
+
+        self._meta.get_field('game').mark_saved(self)
+        self.version += 1
+        self.updated = now
+
+    def update_game(self, mutate):
+        """
+        Apply ``mutate(game)`` and save it, reloading and re-applying it when
+        another request saved the game first. ``mutate`` returns whether it
+        changed anything.
+        """
+        for attempt in range(UPDATE_RETRIES):
+            if not mutate(self.game):
+                return False
+
+            try:
+                self.save_game()
+                return True
+            except StaleGameError:
+                self.reload()
+
+        raise StaleGameError(self.pk)
+
+    def migrate_turns(self):
+        """
+        Move turns still embedded in the ``game`` blob into ``SettlersTurn`` rows.
+        """
+        if 'turns' not in self.game:
+            return 0
+
+        turns = self.turns
+        try:
+            with transaction.atomic():
+                SettlersTurn.objects.bulk_create([
+                    SettlersTurn.from_turn(self, index, turn)
+                    for index, turn in enumerate(turns)
+                ])
+                del self.game['turns']
+                self.save_game()
+        except IntegrityError:
+            raise StaleGameError(self.pk)
+
+        return len(turns)
 
     def save_next_turn(self, next_turn):
-        player = self.active_player
-        next_turn['played'] = timezone.now().isoformat()
-        self.game['turns'].append(next_turn)
-        self.game.pop('nextRoll', None)
-        self.save()
+        self.migrate_turns()
+        index = self.count_turns()
+        # Stamped by the server; only migrated legacy turns keep their own time
+        turn = SettlersTurn.from_turn(self, index, next_turn, played=timezone.now())
+
+        def apply(game):
+            game.pop('nextRoll', None)
+            # The turn completes any trade offered during it
+            game.pop('tradeOffers', None)
+            return True
+
+        try:
+            with transaction.atomic():
+                turn.save()
+                # A retry reloads the last turn, which is then this one
+                if 'turns' in self.__dict__:
+                    self.turns.append(turn.as_turn())
+                self.__dict__['last_turn'] = turn.as_turn()
+                self.turn_count = index + 1
+                self.update_game(apply)
+        except IntegrityError:
+            # Another submission already took this turn index
+            raise StaleGameError(self.pk)
+
+        from .stats import record_turns  # stats imports this module
+        record_turns(self)
+        self.notify('turn')
 
     def save_trade_offer(self, trade_offer, next_turn):
         now = timezone.now()
-        self.game['tradeOffers'] = {
-            'turn': next_turn,
-            'offers': trade_offer,
-            'created': now.isoformat(),
-            'responses': [],
-            'expires': now + TRADE_TIMEDELTA 
-        }
-        self.game.pop('nextRoll')
-        self.save()
+        # Milliseconds, as the JSON encoder stores it, so the column agrees
+        expires = now + TRADE_TIMEDELTA
+        expires = expires.replace(microsecond=expires.microsecond // 1000 * 1000)
+
+        def apply(game):
+            game['tradeOffers'] = {
+                'turn': next_turn,
+                'offers': trade_offer,
+                'created': now.isoformat(),
+                'responses': [],
+                'expires': expires
+            }
+            game.pop('nextRoll', None)
+            return True
+
+        self.update_game(apply)
+        self.notify('trade-offer')
 
     def save_trade_response(self, response):
-        if 'tradeOffers' not in self.game:
+        response['created'] = timezone.now()
+
+        def apply(game):
+            if 'tradeOffers' not in game:
+                return False
+
+            game['tradeOffers']['responses'] = [response] + [
+                r for r
+                in game['tradeOffers']['responses']
+                if r['color'] != response['color']
+            ]
+            return True
+
+        saved = self.update_game(apply)
+        if saved:
+            self.notify('trade-response')
+        return saved
+
+    def expire_trade_offer(self, now=None):
+        """
+        Close the pending trade offer if it expired by ``now``, leaving the
+        active player to play the turn without it, and tell every player.
+        Returns whether the game was saved.
+        """
+        now = now or timezone.now()
+        expired = {}
+
+        def apply(game):
+            offers = game.get('tradeOffers')
+            if offers and trade_expiry(offers) > now:
+                return False
+
+            # Also clears a stale ``trade_expires_at`` when there is no offer
+            expired.update(game.pop('tradeOffers', None) or {})
+            return True
+
+        if not self.update_game(apply):
             return False
 
-        response['created'] = timezone.now()
-        self.game['tradeOffers']['responses'] = [response] + [
-            r for r
-            in self.game['tradeOffers']['responses']
-            if r['color'] != response['color']
-        ]
-        self.save()
+        if expired:
+            self.notify('trade-expired')
+            self.queue_notifications(None, self.active_player['name'], 'trade-expired')
         return True
 
-    def start_next_turn(self):
-        if 'tradeOffers' in self.game:
-            if 'nextRoll' in self.game:
-                self.game.pop('nextRoll')
-                self.save()
-        else:
-            if self.stage != 'play':
-                self.game['nextRoll'] = None
-                self.save()
-            else:
-                if self.game.get('nextRoll') is None:
-                    self.game['nextRoll'] = random_roll()
-                    self.save()
+    def notify(self, kind):
+        event = {'type': kind, 'version': self.version, 'turnCount': self.turn_count}
+        transaction.on_commit(lambda: events.publish(self.pk, event))
+
+    @property
+    def next_roll(self):
+        """
+        The roll the active player must submit: ``None`` while placing
+        settlements, the roll of a pending trade offer's turn, or the roll
+        derived from ``seed`` for the next turn index.
+        """
+        if self.stage != 'play':
+            return None
+
+        game = self.game
+        if 'tradeOffers' in game:
+            return game['tradeOffers']['turn']['roll']
+
+        # Rolled before seeds existed and not played yet
+        if game.get('nextRoll') is not None:
+            return game['nextRoll']
+
+        return seeded_roll(self.seed, self.count_turns())
+
+    def replay(self, index=None):
+        """
+        Return the ``GameState`` after ``index`` turns (default: all of them),
+        resuming from the latest stored snapshot and storing a new one every
+        ``SNAPSHOT_INTERVAL`` turns.
+        """
+        count = self.count_turns()
+        index = count if index is None else min(index, count)
+        snapshot = None
+        if not self.is_archived:
+            snapshot = self.snapshots.filter(index__lte=index).order_by('-index').first()
+
+        replay = Replay(self.game, GameState.from_dict(snapshot.state) if snapshot else None)
+        start = replay.state.index
+        for turn in self.turns_since(start)[:index - start]:
+            state = replay.play_turn(turn)
+            if state.index % SNAPSHOT_INTERVAL == 0 and not self.is_archived:
+                SettlersSnapshot.objects.get_or_create(
+                    settlers=self,
+                    index=state.index,
+                    defaults={'state': state.to_dict()}
+                )
+
+        return replay.state
+
+    def scores(self):
+        state = self.replay()
+        return {
+            'turn': state.index,
+            'robber': state.robber,
+            'longestRoad': state.longest_road,
+            'largestArmy': state.largest_army,
+            'players': [
+                {
+                    'id': player['id'],
+                    'name': player['name'],
+                    'color': player['color'],
+                    'points': state.points_for(player['color'])['total'],
+                    'resources': sum(state.players[player['color']]['resources'].values()),
+                    'cards': sum(state.players[player['color']]['cards'].values()),
+                }
+                for player in self.game['players']
+            ]
+        }
+
+
+class SettlersTurn(models.Model):
+    settlers = models.ForeignKey(Settlers, on_delete=models.CASCADE, related_name='turn_log')
+    index = models.PositiveIntegerField()
+    color = models.CharField(max_length=10)
+    roll = models.PositiveSmallIntegerField(null=True, blank=True)
+    actions = ActionsField(default=list)
+    played = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('settlers', 'index')
+        unique_together = ('settlers', 'index')
+
+    def __str__(self):
+        return f'{self.settlers_id}#{self.index} {self.color}'
+
+    @classmethod
+    def from_turn(cls, settlers, index, turn, played=None):
+        played = played or turn.get('played')
+        if isinstance(played, str):
+            played = parse_datetime(played)
+
+        return cls(
+            settlers=settlers,
+            index=index,
+            color=turn['color'],
+            roll=turn.get('roll'),
+            actions=turn.get('actions', []),
+            played=played or timezone.now()
+        )
+
+    def as_turn(self):
+        return {
+            'roll': self.roll,
+            'color': self.color,
+            'actions': self.actions,
+            'played': self.played.isoformat()
+        }
+
+
+class SettlersSnapshot(models.Model):
+    settlers = models.ForeignKey(Settlers, on_delete=models.CASCADE, related_name='snapshots')
+    index = models.PositiveIntegerField()
+    state = CompactJSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('settlers', 'index')
+
+    def __str__(self):
+        return f'{self.settlers_id}@{self.index}'
+
+
+class SettlersNotification(models.Model):
+    settlers = models.ForeignKey(Settlers, on_delete=models.CASCADE, related_name='notifications')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=20, default='turn')
+    player = models.CharField(max_length=150)
+    extras = JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['sent', 'next_attempt'])]
+
+    def __str__(self):
+        return f'{self.name} to {self.user} for game #{self.settlers_id}'
+
+    def email_message(self):
+        return self.settlers.email_message(self.user, self.player, self.name, self.extras)
+
+
+class SettlersBoard(models.Model):
+    """
+    Pool of pre-generated fair boards, filled by ``settlers_generate_boards``.
+    """
+    layout = models.CharField(max_length=20, db_index=True)
+    board = JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.layout} #{self.pk}'
+
+    @classmethod
+    def take(cls, layout):
+        """
+        Remove and return one pooled board for ``layout``, or ``None`` when
+        the pool is empty.
+        """
+        with transaction.atomic():
+            entry = (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(layout=layout)
+                .order_by('pk')
+                .first()
+            )
+            if entry is None:
+                return None
+            entry.delete()
+            return entry.board
+
+
+class SettlersCheckpoint(models.Model):
+    """
+    Progress of a ``settlers_transform`` run, so an interrupted run resumes
+    after the last committed chunk.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    finished = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_pk}'
+
+
+class SettlersGameStats(models.Model):
+    """
+    Per-game aggregates kept up to date by ``settlers.stats.record_turns``.
+    """
+    settlers = models.OneToOneField(
+        Settlers,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    turns_counted = models.PositiveIntegerField(default=0)
+    # Number of times each roll was made, indexed by roll (0 and 1 unused)
+    rolls = CompactJSONField(default=list)
+    # Resources produced by each hex id
+    production = CompactJSONField(default=dict)
+    winner_color = models.CharField(max_length=10, blank=True)
+    winner_seat = models.PositiveSmallIntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Settlers game stats'
+
+    def __str__(self):
+        return f'Stats for game #{self.settlers_id}'
+
+
+class SettlersStat(models.Model):
+    """
+    A league-wide counter, such as how often ``kind='roll', key='8'`` came up.
+    """
+    kind = models.CharField(max_length=20)
+    key = models.CharField(max_length=20)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'key')
+
+    def __str__(self):
+        return f'{self.kind}:{self.key} = {self.value}'
+
+
+class SettlersArchive(models.Model):
+    """
+    A finished or long-idle game moved out of the ``Settlers`` table, keeping
+    its pk, summary columns and the zlib-compressed game with its turns.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    archived = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField()
+    seed = models.CharField(max_length=32)
+    current_stage = models.CharField(max_length=8)
+    turn_count = models.PositiveIntegerField()
+    active_player_id = models.IntegerField(null=True, blank=True)
+    active_color = models.CharField(max_length=10, blank=True)
+    player_names = models.CharField(max_length=255, blank=True)
+    is_finished = models.BooleanField(default=False)
+    payload = models.BinaryField()
+    player_profiles = models.ManyToManyField(SettlersProfile, blank=True)
+
+    # Archived games keep no pending trade offer
+    ARCHIVED_FIELDS = ('created', 'updated', 'version', 'seed') + tuple(
+        name for name in Settlers.SUMMARY_FIELDS if name != 'trade_expires_at'
+    )
+
+    def __str__(self):
+        return f'Archived game #{self.pk}'
+
+    @classmethod
+    def archive(cls, pk, queryset=None):
+        """
+        Move the game ``pk`` into the archive, or return ``None`` if it is gone,
+        no longer in ``queryset`` once locked, or still has notifications to send.
+        """
+        from .outbox import MAX_ATTEMPTS
+
+        queryset = Settlers.objects.all() if queryset is None else queryset
+        with transaction.atomic():
+            obj = queryset.select_for_update().filter(pk=pk).first()
+            if obj is None:
+                return None
+
+            # Deleting the game would drop its unsent notifications
+            if obj.notifications.filter(sent__isnull=True, attempts__lt=MAX_ATTEMPTS).exists():
+                return None
+
+            payload = zlib.compress(DjangoJSONEncoder().encode(obj.legacy_game).encode(), 9)
+            archive = cls.objects.create(
+                id=obj.pk,
+                payload=payload,
+                **{name: getattr(obj, name) for name in cls.ARCHIVED_FIELDS}
+            )
+            archive.player_profiles.set(obj.player_profiles.all())
+            obj.delete()
+            return archive
+
+    def inflate(self):
+        """
+        Return a read-only, unsaved ``Settlers`` holding the archived game.
+        """
+        obj = Settlers(
+            id=self.pk,
+            game=json.loads(zlib.decompress(self.payload)),
+            **{name: getattr(self, name) for name in self.ARCHIVED_FIELDS}
+        )
+        obj.is_archived = True
+        return obj
+
+    @classmethod
+    def restore(cls, pk):
+        """
+        Move the archived game ``pk`` back into ``Settlers`` so it can be
+        played again, or return ``None`` if it is not archived.
+        """
+        with transaction.atomic():
+            archive = cls.objects.select_for_update().filter(pk=pk).first()
+            if archive is None:
+                return None
+
+            obj = archive.inflate()
+            obj.is_archived = False
+            obj.save(force_insert=True)
+            # Inserting stamps a new creation time
+            Settlers.objects.filter(pk=obj.pk).update(created=archive.created)
+            obj.created = archive.created
+            obj.player_profiles.set(archive.player_profiles.all())
+            obj.migrate_turns()
+            archive.delete()
+            return obj
+
+
+def get_game(pk):
+    """
+    The live game ``pk``, or its inflated archive; raises ``Settlers.DoesNotExist``.
+    """
+    try:
+        return Settlers.objects.get(pk=pk)
+    except Settlers.DoesNotExist:
+        archive = SettlersArchive.objects.filter(pk=pk).first()
+        if archive is None:
+            raise
+        return archive.inflate()
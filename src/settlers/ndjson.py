@@ -0,0 +1,227 @@
+"""
+Stream games to and from newline-delimited JSON, one game per line.
+
+Each line holds the game with its turns, the seed its rolls are derived from,
+its timestamps and the usernames of its players. Archived games are exported
+after the live ones and imported as live games. On import the players are
+matched to local profiles by username and the player ids in the game are
+rewritten to the local user ids; games with a player who has no local profile
+are skipped.
+"""
+import argparse
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Settlers, SettlersArchive, SettlersProfile, SettlersTurn
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+class Filter:
+    """
+    Which games to move: ``updated`` on or after ``since`` and before
+    ``until``, in ``stage`` and played by ``player`` (a username).
+    """
+
+    def __init__(self, since=None, until=None, stage=None, player=None):
+        self.since = since
+        self.until = until
+        self.stage = stage
+        self.player = player
+
+    def queryset(self, queryset):
+        if self.since:
+            queryset = queryset.filter(updated__gte=self.since)
+        if self.until:
+            queryset = queryset.filter(updated__lt=self.until)
+        if self.stage:
+            queryset = queryset.filter(current_stage=self.stage)
+        if self.player:
+            queryset = queryset.filter(player_profiles__user__username=self.player)
+        return queryset
+
+    def __call__(self, record):
+        updated = parse_datetime(record['updated'])
+        return not (
+            (self.since and updated < self.since) or
+            (self.until and updated >= self.until) or
+            (self.stage and record['stage'] != self.stage) or
+            (self.player and self.player not in record['players'].values())
+        )
+
+
+def parse_when(value):
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError(f'{value!r} is not a date')
+        when = datetime(day.year, day.month, day.day)
+    return timezone.make_aware(when) if timezone.is_naive(when) else when
+
+
+def add_arguments(parser):
+    """
+    The file and filter options shared by ``settlers_export`` and ``settlers_import``.
+    """
+    parser.add_argument('path', nargs='?', default='-', help='File name, or - for standard in/out')
+    parser.add_argument('--gzip', action='store_true', help='Implied by a .gz file name')
+    parser.add_argument('--since', type=parse_when, help='Games updated on or after this date')
+    parser.add_argument('--until', type=parse_when, help='Games updated before this date')
+    parser.add_argument('--stage')
+    parser.add_argument('--player', help='Games played by this username')
+
+
+def from_options(options):
+    return Filter(options['since'], options['until'], options['stage'], options['player'])
+
+
+@contextmanager
+def open_stream(options, mode):
+    """
+    Open ``path`` for text in ``mode`` ('r' or 'w'), through gzip if asked.
+    """
+    path = options['path']
+    compress = options['gzip'] or path.endswith('.gz')
+    if path == '-':
+        std = sys.stdin if mode == 'r' else sys.stdout
+        stream = gzip.open(std.buffer, f'{mode}t', encoding='utf-8') if compress else std
+    elif compress:
+        stream = gzip.open(path, f'{mode}t', encoding='utf-8')
+    else:
+        stream = open(path, mode, encoding='utf-8')
+
+    try:
+        yield stream
+    finally:
+        if stream not in (sys.stdin, sys.stdout):
+            stream.close()
+
+
+def to_record(obj, profiles=None):
+    profiles = obj.player_profiles.all() if profiles is None else profiles
+    return {
+        'id': obj.pk,
+        'created': obj.created.isoformat(),
+        'updated': obj.updated.isoformat(),
+        'version': obj.version,
+        'seed': obj.seed,
+        'stage': obj.current_stage,
+        'players': {profile.user_id: profile.user.username for profile in profiles},
+        'game': obj.legacy_game,
+    }
+
+
+def export_games(stream, filter=None, chunk_size=200):
+    """
+    Write every live and then every archived game matching ``filter`` to the
+    text ``stream``; memory use is bounded by ``chunk_size`` games. Returns the
+    number written.
+    """
+    live = Settlers.objects.order_by('pk').prefetch_related('player_profiles__user', 'turn_log')
+    archived = SettlersArchive.objects.order_by('pk').prefetch_related('player_profiles__user')
+    if filter:
+        live = filter.queryset(live).distinct()
+        archived = filter.queryset(archived).distinct()
+
+    count = 0
+    for obj in live.iterator(chunk_size=chunk_size):
+        stream.write(_encoder.encode(to_record(obj)))
+        stream.write('\n')
+        count += 1
+    for archive in archived.iterator(chunk_size=chunk_size):
+        stream.write(_encoder.encode(to_record(archive.inflate(), archive.player_profiles.all())))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def import_games(stream, filter=None, batch_size=200, keep_ids=False):
+    """
+    Create a game for every line of ``stream`` matching ``filter``, one
+    transaction per ``batch_size`` games. Returns ``(games, unmatched)``, the
+    latter being the usernames with no local profile, whose games are skipped.
+    """
+    records = (json.loads(line) for line in stream if line.strip())
+    if filter:
+        records = (record for record in records if filter(record))
+
+    count = 0
+    unmatched = set()
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return count, sorted(unmatched)
+
+        imported, missing = import_batch(batch, keep_ids)
+        unmatched.update(missing)
+        count += imported
+
+
+def import_batch(records, keep_ids=False):
+    """
+    Create the games of ``records`` whose players all have a local profile.
+    Returns the number created and the usernames with no local profile.
+    """
+    usernames = {name for record in records for name in record['players'].values()}
+    profiles = {
+        profile.user.username: profile
+        for profile in SettlersProfile.objects.select_related('user').filter(user__username__in=usernames)
+    }
+
+    games = []
+    imported = []
+    for record in records:
+        game = dict(record['game'])
+        turns = game.pop('turns', [])
+        ids = {
+            int(old_id): profiles[username].user_id
+            for old_id, username in record['players'].items()
+            if username in profiles
+        }
+        # The game would otherwise keep the user ids of another site
+        if any(player['id'] not in ids for player in game.get('players', [])):
+            continue
+
+        game['players'] = [dict(player, id=ids[player['id']]) for player in game.get('players', [])]
+        obj = Settlers(
+            id=record['id'] if keep_ids else None,
+            version=record['version'],
+            seed=record['seed'],
+            game=game
+        )
+        obj.__dict__['turns'] = turns
+        obj.update_summary()
+        games.append(obj)
+        imported.append(record)
+
+    with transaction.atomic():
+        Settlers.objects.bulk_create(games)
+        for obj, record in zip(games, imported):
+            # ``auto_now`` fields are overwritten on insert
+            obj.created = parse_datetime(record['created'])
+            obj.updated = parse_datetime(record['updated'])
+
+        Settlers.objects.bulk_update(games, ['created', 'updated'])
+        SettlersTurn.objects.bulk_create([
+            SettlersTurn.from_turn(obj, index, turn)
+            for obj in games
+            for index, turn in enumerate(obj.turns)
+        ], batch_size=1000)
+        Settlers.player_profiles.through.objects.bulk_create([
+            Settlers.player_profiles.through(settlers_id=obj.pk, settlersprofile_id=profiles[username].pk)
+            for obj, record in zip(games, records)
+            for username in record['players'].values()
+            if username in profiles
+        ])
+
+    return len(games), usernames - profiles.keys()
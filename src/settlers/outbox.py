@@ -0,0 +1,93 @@
+"""
+Delivery of queued ``SettlersNotification`` emails.
+"""
+from datetime import timedelta
+
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SettlersNotification
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = timedelta(minutes=1)
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def pending(now=None):
+    return SettlersNotification.objects.filter(
+        sent__isnull=True,
+        attempts__lt=MAX_ATTEMPTS,
+        next_attempt__lte=now or timezone.now()
+    ).order_by('next_attempt', 'pk')
+
+
+def claim(batch_size):
+    """
+    Reserve up to ``batch_size`` due notifications by pushing their
+    ``next_attempt`` past the claim timeout, so that concurrent workers skip them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            pending(now).select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+        )
+        SettlersNotification.objects.filter(pk__in=ids).update(next_attempt=now + CLAIM_TIMEOUT)
+
+    return list(SettlersNotification.objects.filter(pk__in=ids).select_related('settlers', 'user'))
+
+
+def retry_later(notification, why, now):
+    notification.attempts += 1
+    notification.error = str(why)
+    notification.next_attempt = now + RETRY_BACKOFF * 2 ** (notification.attempts - 1)
+
+
+def send_batch(batch_size=100, connection=None):
+    """
+    Send one batch over a single connection. Returns ``(sent, failed)``.
+    """
+    notifications = claim(batch_size)
+    if not notifications:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or mail.get_connection()
+    try:
+        connection.open()
+    except Exception as why:
+        # Count the attempt, or the batch would stay claimed with no backoff
+        now = timezone.now()
+        for notification in notifications:
+            retry_later(notification, why, now)
+        failed = len(notifications)
+    else:
+        with connection:
+            for notification in notifications:
+                now = timezone.now()
+                try:
+                    connection.send_messages([notification.email_message()])
+                except Exception as why:
+                    failed += 1
+                    retry_later(notification, why, now)
+                else:
+                    sent += 1
+                    notification.sent = now
+                    notification.error = ''
+
+    SettlersNotification.objects.bulk_update(
+        notifications,
+        ['sent', 'attempts', 'next_attempt', 'error']
+    )
+    return sent, failed
+
+
+def send_outbox(batch_size=100, connection=None):
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size, connection)
+        if not (sent or failed):
+            return total_sent, total_failed
+
+        total_sent += sent
+        total_failed += failed
@@ -0,0 +1,333 @@
+"""
+Server-side replay of a game's turn history, the Python counterpart of
+``Game.playTo`` in ``static/settlers/js/models/game.js``.
+"""
+import copy
+
+from .board import Board
+from .layouts import DEV_CARDS, PURCHASE, RESOURCES, get_layout
+
+
+# What a malformed turn or action raises before a rule is even checked
+MALFORMED = (AttributeError, KeyError, IndexError, TypeError, ValueError)
+
+
+class ReplayError(Exception):
+    pass
+
+
+class GameState:
+    """
+    Compact, JSON-serializable state after ``index`` turns have been played.
+    """
+
+    def __init__(self, players, robber, index=0):
+        self.index = index
+        self.players = players
+        self.robber = robber
+        self.vertices = {}
+        self.edges = {}
+        self.longest_road = None
+        self.longest_road_count = 4
+        self.largest_army = None
+        self.largest_army_count = 2
+        self.winner = None
+
+    @classmethod
+    def initial(cls, game, board, layout):
+        players = {
+            p['color']: {
+                'resources': dict.fromkeys(RESOURCES, 0),
+                'cards': dict.fromkeys(DEV_CARDS, 0),
+                'played': dict.fromkeys(DEV_CARDS, 0),
+                'constructs': dict(layout['constructs']),
+                'harbors': [],
+                'roads': [],
+            }
+            for p in game['players']
+        }
+        return cls(players, game.get('robber') or board.desert)
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'players': self.players,
+            'robber': self.robber,
+            'vertices': [[v, c, k] for v, (c, k) in self.vertices.items()],
+            'edges': [[e, c] for e, c in self.edges.items()],
+            'longestRoad': [self.longest_road, self.longest_road_count],
+            'largestArmy': [self.largest_army, self.largest_army_count],
+            'winner': self.winner,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(copy.deepcopy(data['players']), data['robber'], data['index'])
+        state.vertices = {v: (c, k) for v, c, k in data['vertices']}
+        state.edges = {e: c for e, c in data['edges']}
+        state.longest_road, state.longest_road_count = data['longestRoad']
+        state.largest_army, state.largest_army_count = data['largestArmy']
+        state.winner = data.get('winner')
+        return state
+
+    def points_for(self, color):
+        player = self.players[color]
+        constructs = player['constructs']
+        built = {
+            'city': sum(1 for c, k in self.vertices.values() if c == color and k == 'city'),
+            'settlement': sum(
+                1 for c, k in self.vertices.values() if c == color and k == 'settlement'
+            ),
+            'road': len(player['roads']),
+        }
+        total = built['city'] * 2 + built['settlement']
+        if self.longest_road == color:
+            total += 2
+        if self.largest_army == color:
+            total += 2
+
+        return dict(
+            built,
+            total=total,
+            longestRoad=self.longest_road == color,
+            largestArmy=self.largest_army == color,
+            grandTotal=total + player['cards']['VP'] + player['played']['VP'],
+            remaining=dict(constructs),
+        )
+
+
+def _add(resources, kind, count=1):
+    resources[kind] += count
+
+
+def _deplete(resources, kind, count=1):
+    if resources[kind] < count:
+        raise ReplayError(f'Cannot deplete {count} {kind} from {resources}')
+    resources[kind] -= count
+
+
+class Replay:
+
+    def __init__(self, game, state=None):
+        self.game = game
+        self.board = Board.for_game(game)
+        self.topology = self.board.topology
+        self.layout = get_layout(self.board.layout)
+        self.state = state or GameState.initial(game, self.board, self.layout)
+
+    def play(self, turns):
+        for turn in turns:
+            self.play_turn(turn)
+        return self.state
+
+    def play_to(self, index):
+        return self.play(self.game['turns'][self.state.index:index])
+
+    def play_turn(self, turn):
+        try:
+            is_init = not turn.get('roll')
+            self.begin_turn(turn)
+            for action in turn['actions']:
+                self.play_action(action, turn['color'], is_init)
+        except MALFORMED as why:
+            raise ReplayError(f'Malformed turn: {why!r}')
+
+        self.state.index += 1
+        return self.state
+
+    def begin_turn(self, turn):
+        """
+        Hand out the resources a turn starts with, before any of its actions.
+        """
+        if not turn.get('roll'):
+            self._play_init_construction(turn, self.state.players[turn['color']])
+        elif turn['roll'] != 7:
+            self._play_player_resources(turn['roll'])
+
+    def play_action(self, action, color, is_init=False):
+        state = self.state
+        player = state.players[color]
+        kind = action['type']
+        if kind == 'robber':
+            self._play_robber(action, player)
+        elif kind == 'purchase':
+            _deplete_purchase(player['resources'], 'development')
+            _add(player['cards'], action['card'])
+        elif kind == 'play':
+            self._play_dev_card(action, color, player)
+        elif kind == 'trade':
+            self._play_trade(action, player)
+        elif kind == 'win':
+            state.winner = color
+        elif kind in ('road', 'settlement', 'city'):
+            self._play_construction(
+                kind,
+                self._location(kind, action['hex'], action['node']),
+                color,
+                player,
+                free=is_init
+            )
+        else:
+            raise ReplayError(f'Unknown action type {kind}')
+
+    def _location(self, kind, hex_id, node):
+        try:
+            if kind == 'road':
+                return self.topology.edge(hex_id, node)
+            return self.topology.vertex(hex_id, node)
+        except (KeyError, IndexError, ValueError):
+            raise ReplayError(f'Invalid {kind} location {hex_id}{node}')
+
+    def _play_init_construction(self, turn, player):
+        if self.state.index < len(self.state.players):
+            return
+
+        settlement = turn['actions'][0]
+        vertex = self._location('settlement', settlement['hex'], settlement['node'])
+        for hex_id in self.topology.vertex_hexes[vertex]:
+            resource = self.board.resources[hex_id]
+            if resource in RESOURCES:
+                _add(player['resources'], resource)
+
+    def _play_player_resources(self, roll):
+        state = self.state
+        for hex_id in self.board.chits.get(roll, ()):
+            if hex_id == state.robber:
+                continue
+            resource = self.board.resources[hex_id]
+            for vertex in self.topology.hex_vertices[hex_id]:
+                if vertex in state.vertices:
+                    color, kind = state.vertices[vertex]
+                    _add(state.players[color]['resources'], resource, 2 if kind == 'city' else 1)
+
+    def _play_robber(self, action, player):
+        state = self.state
+        for color, losses in action.get('losses') or ():
+            for resource in losses:
+                _deplete(state.players[color]['resources'], resource)
+
+        if action.get('hex'):
+            state.robber = int(action['hex'])
+
+        if action.get('victim') and action.get('resource'):
+            _deplete(state.players[action['victim']]['resources'], action['resource'])
+            _add(player['resources'], action['resource'])
+
+    def _play_dev_card(self, action, color, player):
+        card = action['card']
+        _deplete(player['cards'], card)
+        _add(player['played'], card)
+        if card == 'RB':
+            # Older clients spread the two roads into the action as '0' and '1'
+            roads = action['roads'] if 'roads' in action else [action['0'], action['1']]
+            for hex_id, node in roads:
+                edge = self._location('road', hex_id, node)
+                self._play_construction('road', edge, color, player, free=True)
+        elif card == 'YP':
+            _add(player['resources'], action['yp1'])
+            _add(player['resources'], action['yp2'])
+        elif card == 'MP':
+            kind = action['monopolize']
+            for other_color, other in self.state.players.items():
+                if other_color != color:
+                    _add(player['resources'], kind, other['resources'][kind])
+                    other['resources'][kind] = 0
+        elif card == 'KN':
+            self._play_robber(action, player)
+            knights = player['played']['KN']
+            if knights > self.state.largest_army_count:
+                self.state.largest_army = color
+                self.state.largest_army_count = knights
+
+    def _play_trade(self, action, player):
+        resources = player['resources']
+        if action['by'] == 'player':
+            other = self.state.players[action['trader']]['resources']
+            for offer in action['offers']:
+                _deplete(resources, offer['resource'], offer['count'])
+                _add(other, offer['resource'], offer['count'])
+            for want in action['wants']:
+                _deplete(other, want['resource'], want['count'])
+                _add(resources, want['resource'], want['count'])
+            return
+
+        cost = trade_cost(player, action)
+        if not cost:
+            raise ReplayError(f'Cannot make trade {action}')
+
+        _deplete(resources, action['offers'], cost)
+        _add(resources, action['wants'])
+
+    def _play_construction(self, kind, location, color, player, free=False):
+        state = self.state
+        constructs = player['constructs']
+        if constructs[kind] < 1:
+            raise ReplayError(f'No more {kind}s for {color}')
+
+        constructs[kind] -= 1
+        if kind == 'road':
+            state.edges[location] = color
+            player['roads'].append(location)
+        else:
+            state.vertices[location] = (color, kind)
+            if kind == 'city':
+                constructs['settlement'] += 1
+            elif location in self.board.harbors:
+                player['harbors'].append(self.board.harbors[location])
+
+        if not free:
+            _deplete_purchase(player['resources'], kind)
+
+        if kind == 'road':
+            length = longest_road(self.topology, state, color)
+            if length > state.longest_road_count:
+                state.longest_road_count = length
+                state.longest_road = color
+
+
+def _deplete_purchase(resources, kind):
+    for resource, count in PURCHASE[kind]:
+        _deplete(resources, resource, count)
+
+
+def trade_cost(player, action):
+    if action['by'] == 'bank':
+        return 4 if player['resources'][action['offers']] >= 4 else 0
+
+    harbors = player['harbors']
+    if action['offers'] in harbors:
+        return 2
+    if '3' in harbors or '?' in harbors:
+        return 3
+    return 0
+
+
+def longest_road(topology, state, color):
+    """
+    Length of ``color``'s longest continuous road, found by depth-first search
+    over edges. Opposing settlements and cities break a road.
+    """
+    roads = {e for e, c in state.edges.items() if c == color}
+    best = 0
+
+    def blocked(vertex):
+        owner = state.vertices.get(vertex)
+        return owner is not None and owner[0] != color
+
+    def walk(vertex, seen):
+        nonlocal best
+        best = max(best, len(seen))
+        if blocked(vertex):
+            return
+        for edge in topology.vertex_edges[vertex]:
+            if edge in roads and edge not in seen:
+                a, b = topology.edge_vertices[edge]
+                seen.add(edge)
+                walk(b if a == vertex else a, seen)
+                seen.discard(edge)
+
+    for edge in roads:
+        for start in topology.edge_vertices[edge]:
+            walk(start, set())
+
+    return best
@@ -0,0 +1,87 @@
+"""
+Opt-in read-replica routing for the settlers models.
+
+List the replica aliases in ``SETTLERS_REPLICAS``, add
+``settlers.routers.ReplicaRouter`` to ``DATABASE_ROUTERS`` and
+``settlers.routers.PrimaryPinningMiddleware`` to ``MIDDLEWARE``. Reads of the
+settlers models then go to a random replica, and writes to ``default``.
+
+Reads stay on ``default`` inside a transaction, after anything has been
+written in the same request or command, during unsafe requests (turn, trade
+and new-game POSTs), and for ``SETTLERS_PIN_SECONDS`` after a client's last
+write. The last case uses a cookie, so players never see their own turn
+missing from a lagging replica.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+PIN_COOKIE = 'settlers_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_pinned = ContextVar('settlers_pinned', default=False)
+_wrote = ContextVar('settlers_wrote', default=False)
+
+
+def replicas():
+    return getattr(settings, 'SETTLERS_REPLICAS', ())
+
+
+def is_pinned():
+    return (
+        _pinned.get() or
+        _wrote.get() or
+        transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block
+    )
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if model._meta.app_label != 'settlers' or not aliases or is_pinned():
+            return None
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'settlers':
+            return None
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive their schema from the primary
+        return False if db in replicas() else None
+
+
+class PrimaryPinningMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    '1',
+                    max_age=getattr(settings, 'SETTLERS_PIN_SECONDS', 10),
+                    httponly=True,
+                    samesite='Lax'
+                )
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+
+        return response
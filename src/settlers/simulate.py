@@ -0,0 +1,362 @@
+"""
+Headless games played by simple bots, for load testing and seeding databases.
+
+Every move is played on a ``Validator``, so simulated turns follow the rules a
+submitted turn is held to, and rolls come from the game seed exactly as in a
+live game. ``simulate`` returns a game in the ``settlers_export`` record
+format, ready for ``ndjson.import_batch``.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .board import NODES
+from .generator import PIPS
+from .layouts import PURCHASE, RESOURCES, get_layout
+from .models import TRADE_TIMEDELTA, seeded_roll
+from .replay import ReplayError, trade_cost
+from .validate import Validator
+
+MAX_TURNS = 400
+MAX_ACTIONS = 12
+COLORS = ('red', 'blue', 'orange', 'white')
+
+
+def random_board(layout, rng):
+    """
+    A shuffled board in the ``{'layout', 'grid', 'harbors'}`` format.
+    """
+    layout = get_layout(layout)
+    terrain = [kind for kind, count in layout['terrain'].items() for _ in range(count)]
+    chits = list(layout['chits'])
+    rng.shuffle(terrain)
+    rng.shuffle(chits)
+
+    grid = []
+    for row in layout['grid']:
+        cells = []
+        for kind in row:
+            if kind == 'L':
+                resource = terrain.pop()
+                cells.append(f'{resource}{0 if resource == "D" else chits.pop():x}')
+            else:
+                cells.append(f'{kind}0')
+        grid.append(cells)
+    return {'layout': layout['name'], 'grid': grid, 'harbors': dict(layout['harbors'])}
+
+
+class RandomBot:
+    """
+    Makes any legal move, and often passes.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def pick(self, moves):
+        return self.rng.choice(moves)[1] if moves else None
+
+    def passes(self):
+        return self.rng.random() < 0.3
+
+
+class GreedyBot(RandomBot):
+    """
+    Makes the best scoring move until none is left.
+    """
+
+    def pick(self, moves):
+        if not moves:
+            return None
+        best = max(score for score, move in moves)
+        return self.rng.choice([move for score, move in moves if score == best])
+
+    def passes(self):
+        return False
+
+
+BOTS = {'random': RandomBot, 'greedy': GreedyBot}
+
+
+class Simulation:
+
+    def __init__(self, rng, board, players, bot):
+        self.rng = rng
+        self.bot = bot
+        self.game = dict(board, players=players, isSync=True)
+        self.replay = replay = Validator(self.game)
+        self.state = replay.state
+        self.layout = replay.layout
+        self.turns = []
+        self.deck = [card for card, count in self.layout['developmentCards'].items() for _ in range(count)]
+        rng.shuffle(self.deck)
+
+        topology = self.topology = replay.topology
+        self.vertex_nodes = {}
+        self.edge_nodes = {}
+        for hex_id in topology.land:
+            for node in range(6):
+                self.vertex_nodes.setdefault(topology.hex_vertices[hex_id][node], (hex_id, NODES[node]))
+                self.edge_nodes.setdefault(topology.hex_edges[hex_id][node], (hex_id, NODES[node]))
+
+        pips = {h: PIPS[number] for number, hexes in replay.board.chits.items() for h in hexes}
+        self.hex_pips = pips
+        self.vertex_pips = [sum(pips.get(h, 0) for h in hexes) for hexes in topology.vertex_hexes]
+
+    def color_for(self, index):
+        # The same order as ``Settlers.active_player``
+        players = self.game['players']
+        offset = index % len(players)
+        if len(players) <= index < len(players) * 2:
+            offset = ~offset
+        return players[offset]['color']
+
+    def build(self, kind, location):
+        nodes = self.edge_nodes if kind == 'road' else self.vertex_nodes
+        hex_id, node = nodes[location]
+        return {'type': kind, 'hex': hex_id, 'node': node}
+
+    def can_settle(self, vertex):
+        vertices = self.state.vertices
+        return (
+            self.topology.vertex_on_land[vertex] and
+            vertex not in vertices and
+            not any(other in vertices for other in self.topology.vertex_neighbors[vertex])
+        )
+
+    def road_spots(self, color):
+        topology = self.topology
+        ends = {v for e in self.state.players[color]['roads'] for v in topology.edge_vertices[e]}
+        ends.update(v for v, (c, k) in self.state.vertices.items() if c == color)
+        spots = set()
+        for vertex in ends:
+            for edge in topology.vertex_edges[vertex]:
+                if edge in spots or edge in self.state.edges or edge not in self.edge_nodes:
+                    continue
+                try:
+                    self.replay._check_road(edge, color)
+                except ReplayError:
+                    continue
+                spots.add(edge)
+        return spots
+
+    def affords(self, player, kind):
+        return all(player['resources'][r] >= count for r, count in PURCHASE[kind])
+
+    def moves(self, color):
+        state = self.state
+        player = state.players[color]
+        constructs = player['constructs']
+        moves = []
+        if constructs['city'] and self.affords(player, 'city'):
+            moves.extend(
+                (20 + self.vertex_pips[v], self.build('city', v))
+                for v, (c, k) in state.vertices.items() if c == color and k == 'settlement'
+            )
+
+        if constructs['settlement'] and self.affords(player, 'settlement'):
+            moves.extend(
+                (20 + self.vertex_pips[v], self.build('settlement', v))
+                for e in player['roads'] for v in self.topology.edge_vertices[e]
+                if self.can_settle(v)
+            )
+
+        if self.deck and self.affords(player, 'development'):
+            moves.append((10, {'type': 'purchase'}))
+
+        if constructs['road'] and self.affords(player, 'road'):
+            for edge in self.road_spots(color):
+                reach = max(
+                    self.vertex_pips[v] if self.can_settle(v) else 0
+                    for v in self.topology.edge_vertices[edge]
+                )
+                moves.append((reach, self.build('road', edge)))
+
+        resources = player['resources']
+        wants = min(RESOURCES, key=lambda r: (resources[r], r))
+        for offers in RESOURCES:
+            for by in ('harbor', 'bank'):
+                action = {'type': 'trade', 'by': by, 'offers': offers, 'wants': wants}
+                cost = trade_cost(player, action)
+                if offers != wants and cost and resources[offers] >= cost + 1:
+                    moves.append((1, action))
+                    break
+        return moves
+
+    def robber(self, color, kind='robber'):
+        state = self.state
+        topology = self.topology
+
+        def score(hex_id):
+            total = self.hex_pips.get(hex_id, 0)
+            for vertex in topology.hex_vertices[hex_id]:
+                if vertex in state.vertices:
+                    total += 5 if state.vertices[vertex][0] != color else -10
+            return total
+
+        losses = []
+        if kind == 'robber':
+            for other, player in state.players.items():
+                hand = list(Counter(player['resources']).elements())
+                if len(hand) > 7:
+                    losses.append([other, self.rng.sample(hand, len(hand) // 2)])
+
+        lost = {other: Counter(hand) for other, hand in losses}
+        hands = {
+            other: Counter(player['resources']) - lost.get(other, Counter())
+            for other, player in state.players.items()
+        }
+        hex_id = self.bot.pick([(score(h), h) for h in topology.land if h != state.robber])
+        victims = sorted({
+            state.vertices[v][0] for v in topology.hex_vertices[hex_id]
+            if v in state.vertices and state.vertices[v][0] != color
+            and sum(hands[state.vertices[v][0]].values())
+        })
+        victim = self.rng.choice(victims) if victims else None
+        resource = self.rng.choice(list(hands[victim].elements())) if victim else None
+
+        action = {'type': kind, 'hex': hex_id, 'victim': victim, 'resource': resource}
+        if kind == 'robber':
+            action['losses'] = losses
+        else:
+            action['card'] = 'KN'
+        return action
+
+    def play(self, action, color, turn):
+        if action['type'] == 'purchase':
+            action['card'] = self.deck.pop()
+        self.replay.play_action(action, color)
+        turn['actions'].append(action)
+
+        points = self.state.points_for(color)['grandTotal']
+        if points >= self.layout['pointsToWin']:
+            self.replay.play_action({'type': 'win'}, color)
+            turn['actions'].append({'type': 'win', 'points': points})
+            return True
+        return False
+
+    def play_init_turn(self, color, played):
+        spots = [(self.vertex_pips[v], v) for v in self.vertex_nodes if self.can_settle(v)]
+        vertex = self.bot.pick(spots)
+        roads = [
+            (max(self.vertex_pips[v] for v in self.topology.edge_vertices[e]), e)
+            for e in self.topology.vertex_edges[vertex]
+            if e in self.edge_nodes and e not in self.state.edges
+        ]
+        turn = {
+            'roll': None,
+            'color': color,
+            'actions': [self.build('settlement', vertex), self.build('road', self.bot.pick(roads))],
+            'played': played,
+        }
+        self.replay.play_turn(turn)
+        return turn
+
+    def play_turn(self, color, roll, played):
+        turn = {'roll': roll, 'color': color, 'actions': [], 'played': played}
+        replay = self.replay
+        replay.begin_turn(turn)
+        won = False
+        if roll == 7:
+            won = self.play(self.robber(color), color, turn)
+
+        player = self.state.players[color]
+        if not won and player['cards']['KN'] and not self.bot.passes():
+            won = self.play(self.robber(color, 'play'), color, turn)
+
+        for _ in range(MAX_ACTIONS):
+            move = None if won else self.bot.pick(self.moves(color))
+            if move is None:
+                break
+            won = self.play(move, color, turn)
+            if self.bot.passes():
+                break
+
+        self.state.index += 1
+        return turn
+
+    def trade_offer(self, color, roll, created):
+        resources = self.state.players[color]['resources']
+        have = [r for r in RESOURCES if resources[r]]
+        if not have:
+            return None
+
+        offers = self.rng.choice(have)
+        wants = self.rng.choice([r for r in RESOURCES if r != offers])
+        return {
+            'turn': {'roll': roll, 'color': color, 'actions': []},
+            'offers': [{
+                'offers': [{'count': 1, 'resource': offers}],
+                'wants': [{'count': 1, 'resource': wants}],
+            }],
+            'created': created.isoformat(),
+            'responses': [],
+            'expires': (created + TRADE_TIMEDELTA).isoformat(timespec='milliseconds'),
+        }
+
+
+def simulate(
+    index,
+    seed=None,
+    bot='greedy',
+    layout='standard34',
+    profiles=(),
+    unfinished=0.1,
+    now=None
+):
+    """
+    Play game number ``index`` of the run ``seed`` and return its export
+    record, with turns played before ``now``. ``profiles`` are
+    ``(user_id, username)`` pairs to seat from; a share ``unfinished`` of the
+    games stop early, some with a pending trade offer.
+    """
+    rng = random.Random(f'{seed}:{index}')
+    seated = rng.sample(list(profiles), rng.choice((3, 4)) if len(profiles) >= 4 else 3)
+    colors = rng.sample(COLORS, len(seated))
+    players = [
+        {'id': user_id, 'name': username, 'color': color}
+        for (user_id, username), color in zip(seated, colors)
+    ]
+    game_seed = f'{rng.getrandbits(128):032x}'
+    sim = Simulation(rng, random_board(layout, rng), players, BOTS[bot](rng))
+
+    now = now or timezone.now()
+    played = created = now - timedelta(days=rng.uniform(1, 365))
+    times = [created]
+    for turn_index in range(MAX_TURNS):
+        played = min(played + timedelta(minutes=rng.uniform(1, 600)), now)
+        times.append(played)
+        color = sim.color_for(turn_index)
+        if turn_index < len(players) * 2:
+            sim.turns.append(sim.play_init_turn(color, played.isoformat()))
+        else:
+            roll = seeded_roll(game_seed, turn_index)
+            sim.turns.append(sim.play_turn(color, roll, played.isoformat()))
+        if sim.state.winner:
+            break
+
+    if rng.random() < unfinished:
+        # Stop anywhere before the end, replaying the kept turns for the state
+        stop = rng.randrange(len(sim.turns))
+        del sim.turns[stop:]
+        sim.state = Validator(sim.game).play(sim.turns)
+        played = times[stop]
+
+    turn_index = len(sim.turns)
+    if not sim.state.winner and turn_index >= len(players) * 2 and rng.random() < 0.5:
+        color = sim.color_for(turn_index)
+        offer = sim.trade_offer(color, seeded_roll(game_seed, turn_index), played)
+        if offer:
+            sim.game['tradeOffers'] = offer
+
+    return {
+        'id': None,
+        'created': created.isoformat(),
+        'updated': played.isoformat(),
+        'version': len(sim.turns),
+        'seed': game_seed,
+        'players': {user_id: username for user_id, username in seated},
+        'game': dict(sim.game, turns=sim.turns),
+    }
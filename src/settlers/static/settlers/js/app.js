@@ -523,7 +523,7 @@ class Controller {
                 }
             }
         }
-        this.playDevelopment('RB', rbData);
+        this.playDevelopment('RB', {roads: rbData});
     }
     handleKN(data, elements) {
         let hex = parseInt(data.knHex);
@@ -679,6 +679,11 @@ export const App = {
     play: function(options) {
         let json = $('#app-status').textContent;
         let status = JSON.parse(json);
+        // The game is shared by every viewer; who is looking comes separately
+        const viewer = $('#app-viewer');
+        if(viewer) {
+            Object.assign(status, JSON.parse(viewer.textContent));
+        }
         console.log(status);
 
         let params = getParams();
@@ -713,6 +718,43 @@ export const App = {
         window.ctx = vw.ctx;
         allClear()
     },
+    listen(url, version, stream=true) {
+        // Reload when the game changes, unless a turn is in progress
+        let source = null;
+        const onUpdate = function(evt) {
+            const turn = window.app ? window.app.currentTurn : null;
+            if(!turn || !turn.actions.length) {
+                if(source) {
+                    source.close();
+                }
+                window.location.reload();
+                return true;
+            }
+            return false;
+        };
+
+        if(!stream) {
+            // Poll on an interval when the server cannot hold a request open
+            const poll = function(seen) {
+                fetch(`${url}?version=${seen}&wait=0`).then(response => {
+                    if(response.status == 200) {
+                        return response.json().then(evt => onUpdate(evt) || setTimeout(() => poll(evt.version), 10000));
+                    }
+                    if(response.status != 404) {
+                        setTimeout(() => poll(seen), 10000);
+                    }
+                }).catch(() => setTimeout(() => poll(seen), 10000));
+            };
+            setTimeout(() => poll(version), 10000);
+            return null;
+        }
+
+        source = new EventSource(`${url}?version=${version}`);
+        for(const type of ['update', 'turn', 'trade-offer', 'trade-response', 'trade-expired']) {
+            source.addEventListener(type, onUpdate);
+        }
+        return source;
+    },
     testRandom(count=10) {
         console.time('randomize');
         for(let i = 0; i < count; i++) {
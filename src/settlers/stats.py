@@ -0,0 +1,234 @@
+"""
+League-wide statistics, kept in ``SettlersGameStats`` rows and
+``SettlersStat`` counters.
+
+``record_turns`` counts the turns a game played since it was last counted, so
+``save_next_turn`` only pays for the new turn; ``rebuild`` recomputes every
+aggregate from the turn log and the archive. Roll histograms use NumPy when it is installed.
+"""
+import logging
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from django.db import models, transaction
+
+from .models import Settlers, SettlersArchive, SettlersGameStats, SettlersStat
+from .replay import Replay, ReplayError
+
+logger = logging.getLogger(__name__)
+
+# The demo game is replayed over and over and is not part of the league
+EXCLUDED_GAMES = (1,)
+ROLLS = range(2, 13)
+
+
+def histogram(rolls):
+    """
+    How often each roll occurs in ``rolls``, as a list indexed by roll.
+    """
+    if np is not None:
+        return np.bincount(np.asarray(rolls, dtype=np.intp), minlength=13).tolist()
+
+    counts = Counter(rolls)
+    return [counts[roll] for roll in range(13)]
+
+
+def production(replay, roll):
+    """
+    Resources each hex produces for ``roll`` in the state ``replay`` is at.
+    """
+    state = replay.state
+    produced = {}
+    for hex_id in replay.board.chits.get(roll, ()):
+        if hex_id == state.robber:
+            continue
+
+        amount = 0
+        for vertex in replay.topology.hex_vertices[hex_id]:
+            if vertex in state.vertices:
+                amount += 2 if state.vertices[vertex][1] == 'city' else 1
+        if amount:
+            produced[hex_id] = amount
+    return produced
+
+
+def count_turns(replay, turns):
+    """
+    Play ``turns`` on ``replay``, returning the resources produced per hex.
+    """
+    produced = Counter()
+    for turn in turns:
+        roll = turn.get('roll')
+        if roll and roll != 7:
+            produced.update(production(replay, roll))
+        replay.play_turn(turn)
+    return produced
+
+
+def tally(obj, start=0):
+    """
+    The roll histogram, resources produced per hex and league counters for
+    the turns of ``obj`` from index ``start`` on.
+    """
+    turns = obj.turns_since(start)
+    rolls = histogram([turn['roll'] for turn in turns if turn.get('roll')])
+    counters = Counter({('roll', str(roll)): rolls[roll] for roll in ROLLS})
+    try:
+        replay = Replay(obj.game, obj.replay(start) if start else None)
+        produced = count_turns(replay, turns)
+    except ReplayError:
+        # Rolls still count for a history the replay cannot follow
+        return rolls, {}, counters
+
+    numbers = {hex_id: number for number, hexes in replay.board.chits.items() for hex_id in hexes}
+    for hex_id, amount in produced.items():
+        counters['production', f'{replay.board.resources[hex_id]}:{numbers[hex_id]}'] += amount
+    return rolls, produced, counters
+
+
+def finish(stats, obj, counters):
+    """
+    Record the winner of ``obj`` in ``stats`` and ``counters``, once.
+    """
+    winner = obj.winner
+    if not winner or stats.winner_color:
+        return
+
+    players = obj.game['players']
+    stats.winner_color = winner
+    stats.winner_seat = next(seat for seat, p in enumerate(players) if p['color'] == winner)
+    counters['games', 'finished'] += 1
+    counters['games', 'turns'] += obj.count_turns()
+    for seat, player in enumerate(players):
+        counters['seat-games', str(seat)] += 1
+        counters['color-games', player['color']] += 1
+    counters['seat-wins', str(stats.winner_seat)] += 1
+    counters['color-wins', winner] += 1
+
+
+def bump(counters):
+    """
+    Add ``counters``, mapping ``(kind, key)`` to an amount, to ``SettlersStat``.
+    """
+    for (kind, key), amount in counters.items():
+        if not amount:
+            continue
+
+        rows = SettlersStat.objects.filter(kind=kind, key=key)
+        if not rows.update(value=models.F('value') + amount):
+            stat, created = SettlersStat.objects.get_or_create(
+                kind=kind,
+                key=key,
+                defaults={'value': amount}
+            )
+            if not created:
+                rows.update(value=models.F('value') + amount)
+
+
+def record_turns(obj):
+    """
+    Count the turns of ``obj`` that are not counted yet, and its winner once
+    the game is won. Never raises, as it runs in the transaction saving a
+    turn; failures are logged and ``rebuild`` repairs the counts.
+    """
+    if obj.pk in EXCLUDED_GAMES or obj.is_archived:
+        return
+
+    try:
+        with transaction.atomic():
+            stats, created = SettlersGameStats.objects.select_for_update().get_or_create(settlers=obj)
+            start = stats.turns_counted
+            if start >= obj.count_turns():
+                return
+
+            rolls, produced, counters = tally(obj, start)
+            stats.rolls = [a + b for a, b in zip(stats.rolls or [0] * 13, rolls)]
+            for hex_id, amount in produced.items():
+                stats.production[str(hex_id)] = stats.production.get(str(hex_id), 0) + amount
+
+            finish(stats, obj, counters)
+            stats.turns_counted = obj.count_turns()
+            stats.save()
+            bump(counters)
+    except Exception:
+        logger.exception('Could not record statistics for game %s', obj.pk)
+
+
+def rebuild(chunk_size=200):
+    """
+    Recompute every aggregate from the turn log and the archived games.
+    Returns the number of games.
+    """
+    games = (
+        Settlers.objects.exclude(pk__in=EXCLUDED_GAMES)
+        .order_by('pk')
+        .prefetch_related('turn_log')
+    )
+    totals = Counter()
+    rows = []
+    count = 0
+    with transaction.atomic():
+        SettlersGameStats.objects.all().delete()
+        SettlersStat.objects.all().delete()
+        for obj in games.iterator(chunk_size=chunk_size):
+            rolls, produced, counters = tally(obj)
+            stats = SettlersGameStats(
+                settlers=obj,
+                turns_counted=len(obj.turns),
+                rolls=rolls,
+                production={str(hex_id): amount for hex_id, amount in produced.items()}
+            )
+            finish(stats, obj, counters)
+            totals.update(counters)
+            rows.append(stats)
+            count += 1
+            if len(rows) >= chunk_size:
+                SettlersGameStats.objects.bulk_create(rows)
+                rows = []
+
+        SettlersGameStats.objects.bulk_create(rows)
+        archives = SettlersArchive.objects.exclude(pk__in=EXCLUDED_GAMES).order_by('pk')
+        for archive in archives.iterator(chunk_size=chunk_size):
+            # Archived games lose their stats row but stay in the league
+            obj = archive.inflate()
+            rolls, produced, counters = tally(obj)
+            finish(SettlersGameStats(), obj, counters)
+            totals.update(counters)
+            count += 1
+
+        SettlersStat.objects.bulk_create([
+            SettlersStat(kind=kind, key=key, value=value)
+            for (kind, key), value in totals.items()
+            if value
+        ])
+    return count
+
+
+def league():
+    """
+    The dashboard summary, read from the ``SettlersStat`` counters.
+    """
+    counters = defaultdict(dict)
+    for kind, key, value in SettlersStat.objects.values_list('kind', 'key', 'value'):
+        counters[kind][key] = value
+
+    def rates(kind):
+        wins, games = counters[f'{kind}-wins'], counters[f'{kind}-games']
+        return {
+            key: {'games': played, 'wins': wins.get(key, 0), 'rate': wins.get(key, 0) / played}
+            for key, played in games.items()
+        }
+
+    finished = counters['games'].get('finished', 0)
+    return {
+        'rolls': {str(roll): counters['roll'].get(str(roll), 0) for roll in ROLLS},
+        'production': counters['production'],
+        'seats': rates('seat'),
+        'colors': rates('color'),
+        'finished': finished,
+        'averageLength': counters['games'].get('turns', 0) / finished if finished else None,
+    }
@@ -0,0 +1,28 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from .. import bundle
+
+register = template.Library()
+
+
+@register.simple_tag
+def settlers_module(path):
+    """
+    The URL to import the names of the module ``path`` from: its bundle once
+    ``settlers_build_js`` has run, otherwise the module itself.
+    """
+    return static(bundle.resolve(path))
+
+
+@register.simple_tag
+def settlers_preload(*paths):
+    """
+    ``modulepreload`` hints for everything the modules ``paths`` load.
+    """
+    return format_html_join(
+        '\n',
+        '<link rel="modulepreload" href="{}">',
+        ((static(path),) for path in bundle.preloads(paths or bundle.ENTRIES))
+    )
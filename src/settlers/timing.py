@@ -0,0 +1,132 @@
+"""
+Opt-in per-request instrumentation.
+
+Add ``settlers.timing.TimingMiddleware`` to ``MIDDLEWARE`` to time the phases
+marked with ``timed()`` in the views, count SQL queries and response bytes,
+emit them as a ``Server-Timing`` header and keep a rolling per-view aggregate
+for the staff ``stats`` endpoint. Without the middleware ``timed()`` returns a
+shared no-op context manager.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+WINDOW = getattr(settings, 'SETTLERS_TIMING_WINDOW', 500)
+
+_recorder = ContextVar('settlers_timing', default=None)
+_noop = nullcontext()
+
+
+class Recorder:
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.queries = 0
+        self.db = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+
+def timed(name):
+    """
+    Context manager timing ``name`` for the current request, if it is recorded.
+    """
+    recorder = _recorder.get()
+    return _noop if recorder is None else recorder.phase(name)
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, round(pct / 100 * (len(samples) - 1)))]
+
+
+class Aggregate:
+    """
+    The last ``WINDOW`` samples of each view.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, view, total, queries, size):
+        with self.lock:
+            if view not in self.samples:
+                self.samples[view] = deque(maxlen=self.window)
+            self.samples[view].append((total, queries, size))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self.lock:
+            samples = {view: list(values) for view, values in self.samples.items()}
+
+        stats = {}
+        for view, values in sorted(samples.items()):
+            totals = [v[0] for v in values]
+            stats[view] = {
+                'count': len(values),
+                'p50': round(percentile(totals, 50), 2),
+                'p95': round(percentile(totals, 95), 2),
+                'queries': round(sum(v[1] for v in values) / len(values), 1),
+                'bytes': round(sum(v[2] for v in values) / len(values)),
+            }
+        return stats
+
+
+aggregate = Aggregate()
+
+
+def server_timing(recorder, total, size):
+    metrics = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in recorder.phases.items()]
+    metrics.append(f'db;dur={recorder.db * 1000:.1f};desc="{recorder.queries} queries"')
+    metrics.append(f'total;dur={total:.1f};desc="{size} bytes"')
+    return ', '.join(metrics)
+
+
+class TimingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+
+        total = (time.perf_counter() - start) * 1000
+        size = 0 if response.streaming else len(response.content)
+        response['Server-Timing'] = server_timing(recorder, total, size)
+
+        match = request.resolver_match
+        if match:
+            aggregate.add(match.view_name, total, recorder.queries, size)
+
+        return response
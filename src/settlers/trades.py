@@ -0,0 +1,41 @@
+"""
+Resolve trade offers nobody completed before they expired.
+
+``Settlers.trade_expires_at`` mirrors the pending offer's expiry, so a sweep
+only reads the expired rows through its index.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Settlers
+
+
+def expired(now):
+    return Settlers.objects.filter(trade_expires_at__lte=now)
+
+
+def expire_batch(batch_size=100, now=None):
+    """
+    Resolve up to ``batch_size`` expired offers, oldest first, each under its
+    own row lock. Games locked by a player's request are left for the next
+    sweep. Returns the number of games resolved.
+    """
+    now = now or timezone.now()
+    pks = list(expired(now).order_by('trade_expires_at').values_list('pk', flat=True)[:batch_size])
+    count = 0
+    for pk in pks:
+        with transaction.atomic():
+            obj = expired(now).select_for_update(skip_locked=True).filter(pk=pk).first()
+            if obj is not None and obj.expire_trade_offer(now):
+                count += 1
+    return count
+
+
+def expire_trades(batch_size=100, now=None):
+    now = now or timezone.now()
+    total = 0
+    while True:
+        count = expire_batch(batch_size, now)
+        if not count:
+            return total
+        total += count
@@ -0,0 +1,45 @@
+"""
+Registered transformations of the ``Settlers.game`` JSON, applied in bulk by
+the ``settlers_transform`` management command.
+
+A transform takes a game dict and returns the rewritten dict, or ``None`` when
+the game needs no change. Transforms may run in worker processes, so they must
+be pure functions of the game and must not touch ``players`` or ``turns``,
+which the denormalized summary columns are derived from.
+"""
+import re
+
+from .layouts import get_layout
+
+TRANSFORMS = {}
+
+
+def register(name):
+    def decorator(func):
+        TRANSFORMS[name] = func
+        return func
+    return decorator
+
+
+def apply(name, game):
+    return TRANSFORMS[name](game)
+
+
+@register('init-grid')
+def init_to_grid(game):
+    """
+    Rewrite the legacy ``init`` block into the ``layout``/``grid``/``harbors``
+    format.
+    """
+    if 'init' not in game:
+        return None
+
+    init = game.pop('init')
+    layout = init.get('name', 'standard34')
+    cells = re.findall(r'..', init['grid'])
+    width = len(get_layout(layout)['grid'][0])
+    game['harbors'] = {f'{h["hex"]}{h["edge"]}': h['resource'] for h in init['harbors']}
+    game['grid'] = [cells[i:i + width] for i in range(0, len(cells), width)]
+    game['layout'] = layout
+    game.setdefault('isSync', False)
+    return game
@@ -8,11 +8,16 @@ app_name = 'settlers'
 urlpatterns = [
     path('', views.ListingView.as_view(), name='listing'),
     path('api/<int:pk>/', views.api, name='api'),
+    path('api/status/', views.games_status, name='api-status'),
     path('demo/', views.GameDemoView.as_view(), name='demo'),
     path('random/', views.RandomView.as_view(), name='random'),
     path('new/', views.NewView.as_view(), name='new'),
+    path('stats/', views.timing_stats, name='stats'),
+    path('stats/league/', views.league_stats, name='league-stats'),
     path('seafarers/', views.SeafarersView.as_view(), name='new'),
     path('<int:pk>/', views.GameDetailView.as_view(), name='detail'),
     path('<int:pk>/data/', views.game_state, name='detail-data'),
+    path('<int:pk>/events/', views.game_events, name='detail-events'),
+    path('<int:pk>/scores/', views.game_scores, name='detail-scores'),
     path('<int:pk>/email/', views.game_email, name='detail-email')
 ]
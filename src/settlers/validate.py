@@ -0,0 +1,120 @@
+"""
+Check a submitted turn against the replayed board before it is saved.
+
+``Replay`` already rejects turns that spend resources a player does not have
+or build more pieces than the layout allows; ``Validator`` adds the placement
+rules that ``board.js`` enforces on the client, the shape of setup turns and
+the points needed to win.
+"""
+from .replay import Replay, ReplayError
+
+SETUP_ACTIONS = ['settlement', 'road']
+
+
+class Validator(Replay):
+
+    is_init = False
+    placed = None
+
+    def begin_turn(self, turn):
+        if turn.get('color') not in self.state.players:
+            raise ReplayError(f'Unknown color {turn.get("color")}')
+
+        self.is_init = not turn.get('roll')
+        self.placed = None
+        actions = turn.get('actions')
+        if not isinstance(actions, list):
+            raise ReplayError(f'Invalid actions {actions}')
+        for action in actions:
+            if not isinstance(action, dict) or 'type' not in action:
+                raise ReplayError(f'Invalid action {action}')
+
+        if self.is_init != (self.state.index < len(self.state.players) * 2):
+            raise ReplayError(f'Turn {self.state.index} has the wrong roll {turn.get("roll")}')
+        if self.is_init and [action['type'] for action in actions] != SETUP_ACTIONS:
+            raise ReplayError('A setup turn builds one settlement and then one road')
+        super().begin_turn(turn)
+
+    def play_action(self, action, color, is_init=False):
+        if action['type'] == 'win':
+            points = self.state.points_for(color)['grandTotal']
+            if points < self.layout['pointsToWin']:
+                raise ReplayError(f'{color} cannot win with {points} points')
+        super().play_action(action, color, is_init)
+
+    def _play_construction(self, kind, location, color, player, free=False):
+        if kind == 'road':
+            self._check_road(location, color)
+        elif kind == 'settlement':
+            self._check_settlement(location, color, free)
+        elif self.state.vertices.get(location) != (color, 'settlement'):
+            raise ReplayError(f'{color} has no settlement to upgrade at {location}')
+
+        super()._play_construction(kind, location, color, player, free)
+        if kind == 'settlement' and self.is_init:
+            self.placed = location
+
+    def _check_settlement(self, vertex, color, is_init):
+        topology = self.topology
+        vertices = self.state.vertices
+        if not topology.vertex_on_land[vertex] or vertex in vertices:
+            raise ReplayError(f'Cannot build a settlement at {vertex}')
+
+        if any(other in vertices for other in topology.vertex_neighbors[vertex]):
+            raise ReplayError(f'Settlement at {vertex} is too close to another')
+
+        if not is_init and not any(
+            self.state.edges.get(edge) == color for edge in topology.vertex_edges[vertex]
+        ):
+            raise ReplayError(f'Settlement at {vertex} is not on a {color} road')
+
+    def _check_road(self, edge, color):
+        topology = self.topology
+        state = self.state
+        if not topology.edge_on_land[edge] or edge in state.edges:
+            raise ReplayError(f'Cannot build a road at {edge}')
+
+        if self.placed is not None:
+            # A placement turn's road leads away from that turn's settlement
+            if self.placed not in topology.edge_vertices[edge]:
+                raise ReplayError(f'Road at {edge} does not touch the new settlement')
+            return
+
+        for vertex in topology.edge_vertices[edge]:
+            owner = state.vertices.get(vertex)
+            if owner is not None:
+                if owner[0] == color:
+                    return
+                # An opponent's building cuts the road
+                continue
+
+            if any(state.edges.get(other) == color for other in topology.vertex_edges[vertex]):
+                return
+
+        raise ReplayError(f'Road at {edge} is not connected to {color}')
+
+    def _play_robber(self, action, player):
+        hex_id = action.get('hex')
+        if hex_id and (int(hex_id) not in self.topology.land or int(hex_id) == self.state.robber):
+            raise ReplayError(f'Cannot move the robber to {hex_id}')
+        super()._play_robber(action, player)
+
+
+def validate_turn(obj, turn):
+    """
+    Raise ``ReplayError`` if ``turn`` is not a legal next turn for the game
+    ``obj``. Games whose history cannot be replayed are not checked.
+    """
+    if not isinstance(turn, dict):
+        raise ReplayError(f'Invalid turn {turn}')
+
+    active = obj.active_player
+    if turn.get('color') != active['color']:
+        raise ReplayError(f'It is not {turn.get("color")}\'s turn')
+
+    try:
+        state = obj.replay()
+    except ReplayError:
+        return
+
+    Validator(obj.game, state).play_turn(turn)
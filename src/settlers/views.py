@@ -1,16 +1,45 @@
+import asyncio
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
 from django import http
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.functional import cached_property
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 
 from vanilla import TemplateView, DetailView, UpdateView, CreateView
 
-from .models import Settlers, SettlersProfile
+from .events import get_notifier
+from .models import (
+    Settlers, SettlersArchive, SettlersGameStats, SettlersProfile, StaleGameError, get_game
+)
 from .forms import SubmitError, SettlersTurnForm, SettlersNewGameForm, SettlersAcceptTradeForm
+from .timing import aggregate, timed
+from . import stats
 from . import __version__ as VERSION
 
+EVENTS_HEARTBEAT = 15
+EVENTS_MAX_WAIT = 60
+PAGE_CACHE_TIMEOUT = getattr(settings, 'SETTLERS_PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_game_or_404(pk):
+    try:
+        return get_game(pk)
+    except Settlers.DoesNotExist:
+        raise http.Http404('No game found')
+
 
 def api(request, pk):
     user = request.user
@@ -50,10 +79,46 @@ class SeafarersView(SettlersMixin, TemplateView):
 
 class ListingView(SettlersMixin, TemplateView):
     template_name = 'settlers/listing.html'
+    paginate_by = 50
+    listing_fields = (
+        'id',
+        'updated',
+        'turn_count',
+        'active_color',
+        'player_names',
+        'is_finished',
+    )
+
+    @staticmethod
+    def parse_cursor(value):
+        updated, _, pk = (value or '').rpartition('_')
+        updated = parse_datetime(updated) if updated else None
+        if updated is None or not pk.isdigit():
+            return None
+
+        return updated, int(pk)
+
+    def get_queryset(self):
+        queryset = Settlers.objects.exclude(pk=1).only(*self.listing_fields)
+        cursor = self.parse_cursor(self.request.GET.get('before'))
+        if cursor:
+            updated, pk = cursor
+            queryset = queryset.filter(
+                Q(updated__lt=updated) | Q(updated=updated, pk__lt=pk)
+            )
+
+        return queryset.order_by('-updated', '-id')
 
     def get_context_data(self, **kwargs):
+        games = list(self.get_queryset()[:self.paginate_by + 1])
+        next_cursor = None
+        if len(games) > self.paginate_by:
+            games = games[:self.paginate_by]
+            next_cursor = f'{games[-1].updated.isoformat()}_{games[-1].pk}'
+
         return super().get_context_data(
-            games=Settlers.objects.order_by('-updated'),
+            games=games,
+            next_cursor=next_cursor,
             **kwargs
         )
 
@@ -81,7 +146,8 @@ class BaseGameView(SettlersMixin, UpdateView):
 
     @cached_property
     def object(self):
-        return self.get_object()
+        with timed('load'):
+            return self.get_object()
 
     @cached_property
     def active_player(self):
@@ -89,9 +155,10 @@ class BaseGameView(SettlersMixin, UpdateView):
 
     @cached_property
     def is_user_active_player(self):
+        # The denormalized column saves loading the turns for every viewer
         return (
-            self.request.user.is_authenticated and 
-            self.active_player['id'] == self.request.user.id
+            self.request.user.is_authenticated and
+            self.object.active_player_id == self.request.user.id
         )
 
     @cached_property
@@ -99,13 +166,21 @@ class BaseGameView(SettlersMixin, UpdateView):
         if not self.request.user.is_authenticated:
             return False
 
-        profile = SettlersProfile.for_user(self.request.user)
-        if not profile:
-            return False
+        with timed('players'):
+            profile = SettlersProfile.for_user(self.request.user)
+            if not profile:
+                return False
 
-        return profile.settlers_set.filter(pk=self.object.pk).exists()
+            games = profile.settlersarchive_set if self.object.is_archived else profile.settlers_set
+            return games.filter(pk=self.object.pk).exists()
+
+    def get_object(self):
+        return get_game_or_404(self.kwargs['pk'])
 
     def get_form_class(self):
+        if self.object.is_archived:
+            return None
+
         if self.is_user_active_player:
             return self.form_class
         elif self.is_user_player:
@@ -120,27 +195,45 @@ class BaseGameView(SettlersMixin, UpdateView):
         cls = self.get_form_class()
         return cls(data=data, files=files, **kwargs) if cls else None
 
-    def start_next_turn(self):
-        request = self.request
-        if not self.is_user_player:
-            return
+    @cached_property
+    def game_data(self):
+        return self.object.game_data
 
-        if self.is_user_active_player:
-            self.object.start_next_turn()
+    def get_game_data(self):
+        """
+        The game for the page, the same for every viewer. The template only
+        calls this when its cached fragment for the game version is missing.
+        """
+        return self.game_data
+
+    def get_viewer_data(self):
+        """
+        The viewing player and, for the active player, the roll to play.
+        Building it never writes to the game.
+        """
+        if not self.is_user_player:
+            return {}
 
-        self.object.game['user'] = request.user.id
+        data = {'user': self.request.user.id}
+        if self.is_user_active_player and 'tradeOffers' not in self.object.game:
+            data['nextRoll'] = self.object.next_roll
+        return data
 
     def send_notifications(self, name, extras=None):
         active = self.active_player
-        extras = extras or {}
-        others = self.object.users_other_than(active['id'])
-        for p in others:
-            try:
-                self.object.send_email(p, active['name'], name, extras)
-            except Exception as why:
-                messages.warning(self.request, f'Unable to email {p} ({why})')
+        with timed('notify'):
+            self.object.queue_notifications(active['id'], active['name'], name, extras)
 
     def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                self.save_form_data(form)
+        except StaleGameError:
+            raise SubmitError(409)
+
+        return http.HttpResponseRedirect(self.get_success_url())
+
+    def save_form_data(self, form):
         if 'response' in form.cleaned_data:
             result = self.object.save_trade_response(form.cleaned_data['response'])
             if result:
@@ -160,15 +253,13 @@ class BaseGameView(SettlersMixin, UpdateView):
                 messages.success(self.request, 'Your turn has been successfully saved.')
                 self.send_notifications('turn')
 
-        return http.HttpResponseRedirect(self.get_success_url())
-
     def validate_form(self, form):
         if not self.request.user.is_authenticated:
             raise SubmitError(401)
 
         if form.is_valid():
             if 'turn' in form.cleaned_data:
-                if form.cleaned_data['turn']['roll'] != self.object.game['nextRoll']:
+                if form.cleaned_data['turn']['roll'] != self.object.next_roll:
                     raise SubmitError(400)
 
             return self.form_valid(form)
@@ -176,15 +267,25 @@ class BaseGameView(SettlersMixin, UpdateView):
         return self.form_invalid(form)
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(game=self.object.game_data, **kwargs)
+        return super().get_context_data(
+            game=self.get_game_data,
+            viewer=self.get_viewer_data(),
+            event_stream=is_asgi(self.request),
+            page_cache_timeout=PAGE_CACHE_TIMEOUT,
+            **kwargs
+        )
 
     def get(self, request, *args, **kwargs):
-        self.start_next_turn()
         form = self.get_form(instance=self.object)
         context = self.get_context_data(form=form)
-        return self.render_to_response(context)
+        response = self.render_to_response(context)
+        with timed('render'):
+            return response.render()
 
     def post(self, request, *args, **kwargs):
+        if self.object.is_archived:
+            return http.HttpResponseForbidden()
+
         form = self.get_form(data=request.POST, instance=self.object)
         try:
             return self.validate_form(form)
@@ -213,10 +314,11 @@ class GameDemoView(BaseGameView):
             return self.form_valid(form)
         return self.form_invalid(form)
 
-    def start_next_turn(self):
-        active_player = self.active_player
-        self.object.start_next_turn()
-        self.object.game['user'] = active_player['id']
+    def get_viewer_data(self):
+        data = {'user': self.active_player['id']}
+        if 'tradeOffers' not in self.object.game:
+            data['nextRoll'] = self.object.next_roll
+        return data
 
     def send_notifications(self, name, extras=None):
         pass
@@ -225,14 +327,266 @@ class GameDemoView(BaseGameView):
 def game_email(request, pk):
     obj = get_object_or_404(Settlers, pk=pk)
     players = [pp.user for pp in obj.player_profiles.select_related('user')]
-    return render(request, 'settlers/emails/turn.html', {
-        'game': obj,
-        'user': players[0],
-        'player':  players[1]
-    })
+    with timed('email'):
+        return render(request, 'settlers/emails/turn.html', {
+            'game': obj,
+            'user': players[0],
+            'player':  players[1]
+        })
+
+
+def game_meta(request, pk):
+    if not hasattr(request, 'settlers_meta'):
+        meta = Settlers.objects.filter(pk=pk).values_list('updated', 'version').first()
+        if meta is None:
+            meta = SettlersArchive.objects.filter(pk=pk).values_list('updated', 'version').first()
+        request.settlers_meta = meta
 
+    return request.settlers_meta
 
+
+def game_etag(request, pk):
+    meta = game_meta(request, pk)
+    return f'{pk}-{meta[1]}-{meta[0].timestamp()}' if meta else None
+
+
+def game_last_modified(request, pk):
+    meta = game_meta(request, pk)
+    return meta[0] if meta else None
+
+
+@gzip_page
+@condition(etag_func=game_etag, last_modified_func=game_last_modified)
 def game_state(request, pk):
-    obj = get_object_or_404(Settlers, pk=pk)
-    return http.JsonResponse(obj.game, json_dumps_params={'indent': 4})
+    obj = get_game_or_404(pk)
+    since = request.GET.get('since')
+    if since is None:
+        data = obj.legacy_game
+    else:
+        if not since.isdigit():
+            return http.HttpResponseBadRequest()
+
+        data = {
+            'since': int(since),
+            'turnCount': obj.turn_count,
+            'turns': obj.turns_since(int(since)),
+            'tradeOffers': obj.game.get('tradeOffers'),
+        }
+
+    with timed('serialize'):
+        return http.JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+
+
+
+def game_scores(request, pk):
+    obj = get_game_or_404(pk)
+    with timed('replay'):
+        scores = obj.scores()
+    return http.JsonResponse(scores)
+
+
+STATUS_FIELDS = (
+    'id',
+    'version',
+    'updated',
+    'current_stage',
+    'turn_count',
+    'active_player_id',
+    'active_color',
+    'is_finished',
+)
+MAX_STATUS_GAMES = 100
+
+
+def status_rows(request):
+    """
+    Summary columns of the games asked for with ``?ids=1,2,3``, or of the
+    user's own games with ``?mine=1``; ``None`` for a bad request. Cached on
+    the request so the ETag and the view share the queries.
+    """
+    if hasattr(request, 'settlers_status'):
+        return request.settlers_status
+
+    rows = None
+    ids = request.GET.get('ids')
+    if ids is not None:
+        ids = [pk for pk in ids.split(',') if pk]
+        if ids and len(ids) <= MAX_STATUS_GAMES and all(pk.isdigit() for pk in ids):
+            ids = {int(pk) for pk in ids}
+            rows = list(Settlers.objects.filter(pk__in=ids).values(*STATUS_FIELDS, 'trade_expires_at'))
+            missing = ids - {row['id'] for row in rows}
+            if missing:
+                archived = SettlersArchive.objects.filter(pk__in=missing).values(*STATUS_FIELDS)
+                rows.extend(dict(row, trade_expires_at=None, archived=True) for row in archived)
+    elif request.GET.get('mine') and request.user.is_authenticated:
+        rows = list(
+            Settlers.objects.filter(player_profiles__user=request.user)
+            .order_by('-updated', '-id')
+            .values(*STATUS_FIELDS, 'trade_expires_at')[:MAX_STATUS_GAMES]
+        )
+        archived = (
+            SettlersArchive.objects.filter(player_profiles__user=request.user)
+            .order_by('-updated', '-id')
+            .values(*STATUS_FIELDS)[:MAX_STATUS_GAMES]
+        )
+        rows.extend(dict(row, trade_expires_at=None, archived=True) for row in archived)
+        rows = sorted(rows, key=lambda row: (row['updated'], row['id']), reverse=True)[:MAX_STATUS_GAMES]
+
+    if rows is not None:
+        rows.sort(key=lambda row: row['id'])
+    request.settlers_status = rows
+    return rows
+
+
+def status_etag(request):
+    rows = status_rows(request)
+    if rows is None:
+        return None
 
+    digest = hashlib.sha1(str(request.user.id).encode())
+    for row in rows:
+        digest.update(f'{row["id"]}-{row["version"]}-{row["updated"].timestamp()};'.encode())
+    return digest.hexdigest()
+
+
+@gzip_page
+@condition(etag_func=status_etag)
+def games_status(request):
+    """
+    Compact status of many games in at most two queries, for dashboards.
+    """
+    rows = status_rows(request)
+    if rows is None:
+        return http.HttpResponseBadRequest()
+
+    user_id = request.user.id
+    games = [
+        {
+            'id': row['id'],
+            'stage': row['current_stage'],
+            'turnCount': row['turn_count'],
+            'activePlayer': {'id': row['active_player_id'], 'color': row['active_color']},
+            'myTurn': user_id is not None and row['active_player_id'] == user_id and not row['is_finished'],
+            'tradeExpires': row['trade_expires_at'],
+            'finished': row['is_finished'],
+            'archived': row.get('archived', False),
+            'updated': row['updated'],
+            'version': row['version'],
+        }
+        for row in rows
+    ]
+    return http.JsonResponse({'games': games}, json_dumps_params={'separators': (',', ':')})
+
+
+@staff_member_required
+def timing_stats(request):
+    if request.method == 'POST':
+        aggregate.clear()
+    return http.JsonResponse(aggregate.summary())
+
+
+@staff_member_required
+def league_stats(request):
+    """
+    League-wide aggregates, or with ``?game=<pk>`` those of one game.
+    """
+    pk = request.GET.get('game')
+    if pk is None:
+        return http.JsonResponse(stats.league())
+
+    if not pk.isdigit():
+        return http.HttpResponseBadRequest()
+
+    game_stats = get_object_or_404(SettlersGameStats, settlers_id=pk)
+    return http.JsonResponse({
+        'turns': game_stats.turns_counted,
+        'rolls': {roll: game_stats.rolls[roll] for roll in stats.ROLLS},
+        'production': game_stats.production,
+        'winner': game_stats.winner_color or None,
+        'winnerSeat': game_stats.winner_seat,
+    })
+
+
+def is_asgi(request):
+    # Only an ASGI server sends a streaming response as it is generated
+    return isinstance(request, ASGIRequest)
+
+
+def format_event(event):
+    return f'id: {event["version"]}\nevent: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+
+
+async def game_events(request, pk):
+    """
+    Stream game updates as Server-Sent Events, or with ``?wait=<seconds>``
+    answer a single long-poll request. Streams and waits need an ASGI server;
+    under WSGI both answer at once and the game page polls on an interval.
+    Clients resume with ``Last-Event-ID`` or ``?version=`` and get an
+    immediate event if they are behind. Archived games never change, so they
+    are answered at once too.
+    """
+    current_version = sync_to_async(
+        Settlers.objects.filter(pk=pk).values_list('version', flat=True).first
+    )
+    version = await current_version()
+    hold = is_asgi(request) and version is not None
+    if version is None:
+        version = await sync_to_async(
+            SettlersArchive.objects.filter(pk=pk).values_list('version', flat=True).first
+        )()
+        if version is None:
+            raise http.Http404
+
+    seen = request.headers.get('Last-Event-ID') or request.GET.get('version')
+    seen = int(seen) if seen and seen.isdigit() else None
+    notifier = get_notifier()
+
+    if 'wait' in request.GET:
+        try:
+            wait = min(float(request.GET['wait']), EVENTS_MAX_WAIT)
+        except ValueError:
+            return http.HttpResponseBadRequest()
+
+        if not hold:
+            if seen is None or version > seen:
+                return http.JsonResponse({'type': 'update', 'version': version})
+            return http.HttpResponse(status=304)
+
+        async with notifier.subscribe(pk) as subscription:
+            version = await current_version()
+            if seen is None or version > seen:
+                return http.JsonResponse({'type': 'update', 'version': version})
+            try:
+                return http.JsonResponse(await asyncio.wait_for(subscription.get(), wait))
+            except asyncio.TimeoutError:
+                return http.HttpResponse(status=304)
+
+    if not hold:
+        # Under WSGI an endless stream would be buffered forever and hold a
+        # worker, and an archived game has nothing more to send, so answer
+        # with what is pending and let the client reconnect
+        body = f'retry: {EVENTS_HEARTBEAT * 1000}\n\n'
+        if seen is not None and version > seen:
+            body += format_event({'type': 'update', 'version': version})
+        response = http.HttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def stream():
+        async with notifier.subscribe(pk) as subscription:
+            version = await current_version()
+            if seen is not None and version > seen:
+                yield format_event({'type': 'update', 'version': version})
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield format_event(event)
+
+    response = http.StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+Benchmark the game views and model hot paths against synthetic games.
+
+    python benchmark.py --games 50 --turns 400 --output results.json
+    python benchmark.py --turns 400 --baseline results.json
+
+Games are seeded into a throwaway test database. For each endpoint the latency
+percentiles (ms), SQL query count and response size are reported; with
+``--baseline`` any p50 slower than ``--threshold`` times the baseline is
+flagged and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+DATA_DIR = Path(__file__).parent / 'data'
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, round(pct / 100 * (len(samples) - 1)))
+    return samples[index]
+
+
+def synthetic_game(players, turns, trades, rng):
+    """
+    Return ``(game, turns)`` on the game3 board. The opening placements come
+    from game3 so the history replays; every later turn is a bare roll.
+    """
+    source = json.loads((DATA_DIR / 'game3.json').read_text())
+    players = source['players'][:players]
+    colors = {p['color'] for p in players}
+    history = [t for t in source['turns'][:len(source['players']) * 2] if t['color'] in colors]
+
+    order = [p['color'] for p in players]
+    while len(history) < turns:
+        color = order[(len(history) - len(order) * 2) % len(order)]
+        roll = rng.randint(1, 6) + rng.randint(1, 6)
+        history.append({'roll': roll, 'color': color, 'actions': []})
+
+    game = {'isSync': True, 'init': source['init'], 'players': players}
+    if trades:
+        game['tradeOffers'] = {
+            'turn': {'roll': 8, 'color': order[0], 'actions': []},
+            'offers': [
+                {'color': color, 'offers': [{'resource': 'B', 'count': 1}]}
+                for color in order[1:]
+            ] * trades,
+            'created': '2020-07-19T06:08:51+00:00',
+            'responses': [],
+        }
+    return game, history[:turns]
+
+
+def seed(games, players, turns, trades, seed=0):
+    from django.contrib.auth.models import User
+    from settlers.models import Settlers, SettlersProfile, SettlersTurn
+
+    rng = random.Random(seed)
+    created = []
+    for _ in range(games):
+        game, history = synthetic_game(players, turns, trades, rng)
+        for player in game['players']:
+            user, new = User.objects.get_or_create(id=player['id'], username=player['name'])
+            if new:
+                SettlersProfile.objects.create(user=user)
+
+        settlers = Settlers.objects.create(game=game)
+        settlers.player_profiles.set(
+            SettlersProfile.objects.filter(user__in=[p['id'] for p in game['players']])
+        )
+        SettlersTurn.objects.bulk_create(
+            [SettlersTurn.from_turn(settlers, i, turn) for i, turn in enumerate(history)],
+            batch_size=500
+        )
+        settlers.__dict__.pop('turns', None)
+        settlers.turn_count = len(history)
+        settlers.update_summary()
+        settlers.save()
+        created.append(settlers)
+
+    return created
+
+
+def measure(func, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    queries = []
+    size = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+        if getattr(result, 'status_code', 200) >= 400:
+            raise RuntimeError(f'{func.__name__} returned {result.status_code}')
+        size = len(getattr(result, 'content', b''))
+
+    stats = {f'p{pct}': round(percentile(timings, pct), 3) for pct in PERCENTILES}
+    stats.update(
+        max=round(max(timings), 3),
+        queries=statistics.median(queries),
+        bytes=size
+    )
+    return stats
+
+
+def run(games=10, players=4, turns=200, trades=0, repeat=20, seed_value=0):
+    from django.test import Client
+    from django.contrib.auth.models import User
+    from settlers.models import Settlers
+
+    settlers = seed(games, players, turns, trades, seed_value)[-1]
+    pk = settlers.pk
+    client = Client()
+
+    def as_active_player():
+        game = Settlers.objects.get(pk=pk)
+        client.force_login(User.objects.get(pk=game.active_player['id']))
+        return game
+
+    def post_turn():
+        game = as_active_player()
+        turn = {'roll': game.next_roll, 'color': game.active_player['color'], 'actions': []}
+        return client.post(f'/{pk}/', {'turn': json.dumps(turn), 'version': game.version})
+
+    responders = [p for p in settlers.game['players'] if p != settlers.active_player]
+
+    def post_trade_response():
+        player = responders[0]
+        responders.append(responders.pop(0))
+        client.force_login(User.objects.get(pk=player['id']))
+        response = {'color': player['color'], 'accepted': False, 'offers': []}
+        return client.post(f'/{pk}/', {'response': json.dumps(response)})
+
+    def active_player():
+        return Settlers.objects.get(pk=pk).active_player
+
+    def stage():
+        return Settlers.objects.get(pk=pk).stage
+
+    as_active_player()
+    benchmarks = {
+        'listing': lambda: client.get('/'),
+        'detail_get': lambda: client.get(f'/{pk}/'),
+        'game_state': lambda: client.get(f'/{pk}/data/'),
+        'game_state_since': lambda: client.get(f'/{pk}/data/', {'since': turns - 10}),
+        'game_scores': lambda: client.get(f'/{pk}/scores/'),
+        'active_player': active_player,
+        'stage': stage,
+    }
+    if trades:
+        benchmarks['detail_post_trade'] = post_trade_response
+    else:
+        # Last: each iteration plays a turn and grows the history
+        benchmarks['detail_post'] = post_turn
+    return {
+        'config': {
+            'games': games,
+            'players': players,
+            'turns': turns,
+            'trades': trades,
+            'repeat': repeat,
+            'seed': seed_value,
+        },
+        'results': {name: measure(func, repeat) for name, func in benchmarks.items()},
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, stats in results['results'].items():
+        base = baseline['results'].get(name)
+        if base and base['p50'] and stats['p50'] > base['p50'] * threshold:
+            regressions.append(f'{name}: p50 {base["p50"]}ms -> {stats["p50"]}ms')
+        if base and stats['queries'] > base['queries']:
+            regressions.append(f'{name}: queries {base["queries"]} -> {stats["queries"]}')
+    return regressions
+
+
+def report(results, out=sys.stdout):
+    header = ['endpoint'] + [f'p{p}' for p in PERCENTILES] + ['max', 'queries', 'bytes']
+    out.write(''.join(f'{h:>18}' for h in header) + '\n')
+    for name, stats in results['results'].items():
+        values = [stats[h] for h in header[1:]]
+        out.write(f'{name:>18}' + ''.join(f'{v:>18}' for v in values) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--players', type=int, choices=[3, 4], default=4)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--trades', type=int, default=0, help='Pending trade offers per player')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--baseline', type=Path)
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    import django
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+    results = run(args.games, args.players, args.turns, args.trades, args.repeat, args.seed)
+    report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from settlers.models import Settlers
+
+DATA_DIR = Path(__file__).parent / 'data'
+
+
+def load_game(name):
+    return json.loads((DATA_DIR / name).read_text())
+
+
+@pytest.fixture
+def game3(db):
+    return Settlers.objects.create(game=load_game('game3.json'))
+
+
+@pytest.fixture
+def players(game3):
+    from django.contrib.auth.models import User
+    from settlers.models import SettlersProfile
+
+    users = []
+    for player in game3.game['players']:
+        user = User.objects.create_user(
+            player['name'],
+            email=f"{player['name']}@example.com",
+            id=player['id']
+        )
+        game3.player_profiles.add(SettlersProfile.objects.create(user=user))
+        users.append(user)
+    return users
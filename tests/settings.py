@@ -16,10 +16,23 @@ USE_I18N = True
 USE_L10N = True
 USE_TZ = True
 
-DATABASES = {'default': {
-    'ENGINE': 'django.db.backends.sqlite3',
-    'NAME': ':memory:' if 'pytest' in sys.argv else 'settlers.sqlite3',
-}}
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:' if 'pytest' in sys.argv else 'settlers.sqlite3',
+    },
+    # A copy of settlers.sqlite3; used once ReplicaRouter is enabled below
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:' if 'pytest' in sys.argv else 'settlers-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# To try read-replica routing locally, copy settlers.sqlite3 to
+# settlers-replica.sqlite3 and uncomment these (and the middleware below)
+# DATABASE_ROUTERS = ['settlers.routers.ReplicaRouter']
+# SETTLERS_REPLICAS = ['replica']
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -39,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 'settlers.routers.PrimaryPinningMiddleware',
 ]
 TEMPLATES = [
     {
@@ -1,5 +1,982 @@
+import json
+
 import pytest
 
+from settlers import models
+from settlers.replay import Replay, ReplayError
+
+from conftest import load_game
+
 
 def test_a():
     assert True
+
+
+def test_replay_game():
+    game = load_game('game3.json')
+    state = Replay(game).play_to(len(game['turns']))
+    assert state.index == 44
+    assert state.longest_road == 'blue'
+    assert state.points_for('white')['city'] == 1
+    assert state.players['red']['resources'] == {'B': 0, 'O': 0, 'S': 0, 'T': 0, 'G': 2}
+
+
+def test_replay_rejects_bad_history():
+    game = load_game('game3.json')
+    game['turns'][8]['actions'].append({'type': 'city', 'hex': 1, 'node': 'a'})
+    with pytest.raises(ReplayError):
+        Replay(game).play_to(len(game['turns']))
+
+
+def test_replay_snapshots(game3, monkeypatch):
+    monkeypatch.setattr(models, 'SNAPSHOT_INTERVAL', 10)
+    full = game3.replay().to_dict()
+    assert list(game3.snapshots.values_list('index', flat=True)) == [10, 20, 30, 40]
+
+    resumed = game3.replay()
+    assert resumed.to_dict() == full
+    assert game3.replay(25).index == 25
+
+
+def test_game_scores(client, game3):
+    data = client.get(f'/{game3.pk}/scores/').json()
+    assert data['turn'] == 44
+    assert [p['points'] for p in data['players']] == [3, 3, 5, 4]
+
+
+def test_turn_log_backfill(game3):
+    from django.core.management import call_command
+
+    call_command('settlers_backfill_turns', stdout=open('/dev/null', 'w'))
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert 'turns' not in game.game
+    assert game.turn_log.count() == 44
+    assert game.turns == load_game('game3.json')['turns']
+
+
+def test_save_next_turn_appends_to_log(client, game3):
+    game3.save_next_turn({'roll': 8, 'color': 'orange', 'actions': []})
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert 'turns' not in game.game
+    assert [t.index for t in game.turn_log.all()][-2:] == [43, 44]
+
+    data = client.get(f'/{game.pk}/data/').json()
+    assert len(data['turns']) == 45
+    assert data['turns'][-1]['roll'] == 8
+
+    # The server stamps the turn, and appending does not load the whole log
+    game.save_next_turn({'roll': game.next_roll, 'color': 'red', 'actions': [], 'played': '2001-01-01'})
+    assert 'turns' not in game.__dict__
+    assert game.turn_count == 46 and game.active_color == 'blue'
+    assert game.turn_log.last().played.year > 2001
+
+
+def test_concurrent_trade_responses_are_kept(game3):
+    game3.save_trade_offer([{'offers': [], 'wants': []}], {'roll': 4, 'color': 'orange'})
+    first = models.Settlers.objects.get(pk=game3.pk)
+    second = models.Settlers.objects.get(pk=game3.pk)
+    assert first.save_trade_response({'color': 'red', 'accepted': True, 'offers': [0]})
+    assert second.save_trade_response({'color': 'blue', 'accepted': False, 'offers': []})
+
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert [r['color'] for r in game.game['tradeOffers']['responses']] == ['blue', 'red']
+    assert game.version == 3
+
+
+def test_concurrent_turn_is_stale(game3):
+    first = models.Settlers.objects.get(pk=game3.pk)
+    second = models.Settlers.objects.get(pk=game3.pk)
+    first.save_next_turn({'roll': 8, 'color': 'orange', 'actions': []})
+    with pytest.raises(models.StaleGameError):
+        second.save_next_turn({'roll': 8, 'color': 'orange', 'actions': []})
+
+    assert game3.turn_log.count() == 45
+
+
+def test_model_save_checks_version(game3):
+    first = models.Settlers.objects.get(pk=game3.pk)
+    second = models.Settlers.objects.get(pk=game3.pk)
+    first.game['isSync'] = False
+    first.save()
+    assert first.version == game3.version + 1
+
+    second.game['players'] = []
+    with pytest.raises(models.StaleGameError):
+        second.save()
+    assert second.version == game3.version
+    saved = models.Settlers.objects.get(pk=game3.pk)
+    assert saved.is_sync is False and saved.game['players']
+
+
+def test_stale_turn_post_conflicts(client, game3, players):
+    game3.game['nextRoll'] = 8
+    game3.save()
+    client.force_login(players[0])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': '{"roll": 8, "color": "orange", "actions": []}',
+        'version': game3.version - 1,
+    })
+    assert response.status_code == 409
+    assert game3.turn_log.count() == 0
+
+
+def test_turn_queues_notifications(client, game3, players, mailoutbox):
+    from django.core.management import call_command
+
+    game3.game['nextRoll'] = 8
+    game3.save()
+    client.force_login(players[0])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': '{"roll": 8, "color": "orange", "actions": []}',
+        'version': game3.version,
+    })
+    assert response.status_code == 302
+    assert game3.notifications.filter(sent__isnull=True).count() == 3
+    assert mailoutbox == []
+
+    call_command('settlers_send_outbox', stdout=open('/dev/null', 'w'))
+    assert sorted(m.to[0] for m in mailoutbox) == [
+        'danielle@example.com', 'david@example.com', 'dlewis@example.com'
+    ]
+    assert game3.notifications.filter(sent__isnull=True).count() == 0
+
+
+def test_outbox_retries_with_backoff(game3, players):
+    from django.core.mail.backends.base import BaseEmailBackend
+    from django.utils import timezone
+    from settlers import outbox
+
+    class FailingBackend(BaseEmailBackend):
+        def send_messages(self, messages):
+            raise OSError('SMTP unavailable')
+
+    class UnreachableBackend(BaseEmailBackend):
+        def open(self):
+            raise ConnectionRefusedError('Connection refused')
+
+    game3.queue_notifications(players[0].id, 'colleeniem')
+    assert outbox.send_outbox(connection=FailingBackend()) == (0, 3)
+    notification = game3.notifications.first()
+    assert notification.attempts == 1
+    assert notification.error == 'SMTP unavailable'
+    assert outbox.send_outbox() == (0, 0)
+
+    # A connection that cannot be opened counts an attempt and backs off too
+    game3.notifications.update(next_attempt=timezone.now())
+    assert outbox.send_outbox(connection=UnreachableBackend()) == (0, 3)
+    notification = game3.notifications.first()
+    assert notification.attempts == 2
+    assert notification.error == 'Connection refused'
+    assert notification.next_attempt > timezone.now() + outbox.RETRY_BACKOFF
+
+
+def test_summary_columns(game3):
+    assert game3.turn_count == 44
+    assert game3.current_stage == 'play'
+    assert game3.active_color == 'orange'
+    assert game3.player_names == 'colleeniem, dlewis, david, danielle'
+
+    game3.save_next_turn({'roll': 8, 'color': 'orange', 'actions': [{'type': 'win', 'points': 10}]})
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert (game.turn_count, game.active_color, game.is_finished) == (45, 'red', True)
+
+
+def test_listing_keyset_pagination(client, players, monkeypatch):
+    from settlers.views import ListingView
+
+    monkeypatch.setattr(ListingView, 'paginate_by', 2)
+    for i in range(4):
+        models.Settlers.objects.create(game=load_game('game1.json'))
+
+    client.force_login(players[0])
+    response = client.get('/')
+    first = [g.pk for g in response.context['games']]
+    response = client.get('/', {'before': response.context['next_cursor']})
+    second = [g.pk for g in response.context['games']]
+
+    assert len(first) == len(second) == 2
+    assert sorted(first + second, reverse=True) == first + second
+    assert response.context['next_cursor'] is None
+
+
+def test_game_state_conditional_get(client, game3):
+    response = client.get(f'/{game3.pk}/data/')
+    assert response.status_code == 200
+    assert len(response.json()['turns']) == 44
+
+    response = client.get(f'/{game3.pk}/data/', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+    game3.save_trade_response({'color': 'red'})
+    game3.save_trade_offer([], {'roll': 4, 'color': 'orange', 'actions': []})
+    response = client.get(f'/{game3.pk}/data/', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 200
+
+
+def test_game_state_since_and_gzip(client, game3):
+    game3.migrate_turns()
+    data = client.get(f'/{game3.pk}/data/', {'since': 40}).json()
+    assert data['since'] == 40
+    assert data['turnCount'] == 44
+    assert data['turns'] == load_game('game3.json')['turns'][40:]
+
+    response = client.get(f'/{game3.pk}/data/', HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Encoding'] == 'gzip'
+    assert client.get(f'/{game3.pk}/data/', {'since': 'x'}).status_code == 400
+
+
+def test_broadcaster_wakes_subscribers():
+    import asyncio
+    import threading
+    from asgiref.sync import async_to_sync
+    from settlers.events import Broadcaster
+
+    broadcaster = Broadcaster()
+
+    async def listen():
+        async with broadcaster.subscribe(7) as queue:
+            threading.Thread(target=broadcaster.publish, args=(7, {'type': 'turn'})).start()
+            return await asyncio.wait_for(queue.get(), 1)
+
+    assert async_to_sync(listen)() == {'type': 'turn'}
+    assert broadcaster.subscribers == {}
+
+
+def test_game_events_long_poll(client, game3, players):
+    url = f'/{game3.pk}/events/'
+    assert client.get(url, {'wait': 0, 'version': game3.version}).status_code == 304
+
+    game3.save_trade_offer([], {'roll': 4, 'color': 'orange', 'actions': []})
+    data = client.get(url, {'wait': 0, 'version': 0}).json()
+    assert data == {'type': 'update', 'version': game3.version}
+    assert client.get('/999/events/', {'wait': 0}).status_code == 404
+    # Without ASGI a wait would hold the worker, so it answers at once
+    assert client.get(url, {'wait': 30, 'version': game3.version}).status_code == 304
+
+    # Finished games no longer change, so their page does not listen
+    client.force_login(players[0])
+    assert b'App.listen(' in client.get(f'/{game3.pk}/').content
+    models.Settlers.objects.filter(pk=game3.pk).update(is_finished=True)
+    assert b'App.listen(' not in client.get(f'/{game3.pk}/').content
+    models.Settlers.objects.filter(pk=game3.pk).update(is_finished=False)
+
+    # Without ASGI the stream answers at once instead of holding the worker
+    response = client.get(url, {'version': 0})
+    assert response['Content-Type'] == 'text/event-stream'
+    assert response.content.decode().startswith('retry: ')
+    assert f'id: {game3.version}\nevent: update' in response.content.decode()
+
+
+def test_generated_boards_are_fair():
+    from settlers.board import Board
+    from settlers.generator import PIPS, generate_boards
+
+    for layout in ('standard34', 'standard56'):
+        boards = generate_boards(layout, 20, seed=3)
+        assert len(boards) == 20
+        for data in boards:
+            board = Board.for_game(data)
+            red = {h for n in (6, 8) for h in board.chits.get(n, [])}
+            for hex_id in red:
+                assert not red.intersection(board.topology.hex_neighbors[hex_id])
+
+            pips = {h: PIPS[n] for n, hexes in board.chits.items() for h in hexes}
+            for hexes in board.topology.vertex_hexes:
+                assert sum(pips.get(h, 0) for h in hexes) <= 12
+
+    assert generate_boards('standard34', 5, seed=1) == generate_boards('standard34', 5, seed=1)
+
+
+@pytest.mark.django_db
+def test_fair_board_pool(players):
+    from django.core.management import call_command
+    from settlers.forms import SettlersNewGameForm
+
+    call_command('settlers_generate_boards', count=2, seed=5, stdout=open('/dev/null', 'w'))
+    assert models.SettlersBoard.objects.filter(layout='standard34').count() == 2
+
+    # An invalid form leaves the pool alone
+    form = SettlersNewGameForm({'fair_board': 'on', 'player_profiles': []})
+    assert not form.is_valid()
+    assert models.SettlersBoard.objects.count() == 2
+
+    board = models.SettlersBoard.objects.first().board
+    form = SettlersNewGameForm({
+        'fair_board': 'on',
+        'player_profiles': [p.pk for p in models.SettlersProfile.objects.all()[:3]]
+    })
+    assert form.is_valid(), form.errors
+    game = form.save()
+    assert game.game['grid'] == board['grid']
+    assert models.SettlersBoard.objects.count() == 1
+    assert models.SettlersBoard.take('standard56') is None
+
+
+@pytest.mark.django_db
+def test_fair_board_without_numpy(players, monkeypatch):
+    from settlers import generator
+    from settlers.forms import SettlersNewGameForm
+
+    board = generator.generate_boards('standard34', 1, seed=1)[0]
+    monkeypatch.setattr(generator, 'np', None)
+    profiles = [p.pk for p in models.SettlersProfile.objects.all()[:3]]
+    form = SettlersNewGameForm({'fair_board': 'on', 'player_profiles': profiles})
+    assert not form.is_valid()
+    assert 'fair_board' in form.errors
+
+    # A board drawn by the client is kept instead
+    form = SettlersNewGameForm({
+        'fair_board': 'on',
+        'game': json.dumps(board),
+        'player_profiles': profiles,
+    })
+    assert form.is_valid(), form.errors
+    assert form.save().game['grid'] == board['grid']
+
+
+@pytest.mark.django_db
+def test_benchmark_smoke():
+    import benchmark
+
+    results = benchmark.run(games=2, players=3, turns=20, repeat=2)
+    stats = results['results']
+    assert stats['game_state']['bytes'] > 0
+    assert stats['detail_post']['queries'] > 0
+    assert benchmark.compare(results, results, 1.25) == []
+
+
+def test_server_timing(client, game3, settings):
+    from django.contrib.auth.models import User
+    from settlers.timing import aggregate
+
+    settings.MIDDLEWARE = settings.MIDDLEWARE + ['settlers.timing.TimingMiddleware']
+    aggregate.clear()
+    response = client.get(f'/{game3.pk}/data/')
+    header = response['Server-Timing']
+    assert 'serialize;dur=' in header
+    assert 'queries"' in header
+    assert f'desc="{len(response.content)} bytes"' in header
+
+    assert client.get('/stats/').status_code == 302
+    client.force_login(User.objects.create_user('staff', is_staff=True))
+    stats = client.get('/stats/').json()
+    assert stats['settlers:detail-data']['count'] == 1
+    assert set(stats['settlers:detail-data']) == {'count', 'p50', 'p95', 'queries', 'bytes'}
+
+
+def test_timed_is_noop_without_middleware(client, game3):
+    from settlers.timing import timed
+
+    assert timed('load') is timed('render')
+    assert 'Server-Timing' not in client.get(f'/{game3.pk}/data/')
+
+
+def test_transform_init_grid(game3):
+    from io import StringIO
+    from django.core.management import call_command
+    from settlers.board import Board
+
+    other = models.Settlers.objects.create(game=load_game('game3.json'))
+    before = Board.for_game(game3.game).resources
+    out = StringIO()
+    call_command('settlers_transform', 'init-grid', dry_run=True, stdout=out)
+    assert 'would change 2' in out.getvalue()
+    assert 'init' in models.Settlers.objects.get(pk=game3.pk).game
+
+    call_command('settlers_transform', 'init-grid', chunk_size=1, stdout=out)
+    for obj in models.Settlers.objects.all():
+        assert 'init' not in obj.game
+        assert obj.version == 1
+        assert Board.for_game(obj.game).resources == before
+
+    checkpoint = models.SettlersCheckpoint.objects.get(name='init-grid')
+    assert (checkpoint.last_pk, checkpoint.changed) == (other.pk, 2)
+    assert checkpoint.finished is not None
+
+
+def test_codec_round_trip():
+    from settlers import codec
+
+    game = load_game('game3.json')
+    game['grid'] = [['X0', 'W0'], ['GA', 'B3']]
+    packed = codec.dumps(codec.pack_game(game))
+    assert packed.startswith(codec.COMPRESSED)
+    assert codec.unpack_game(codec.loads(packed)) == game
+    assert len(packed) * 4 < len(json.dumps(game))
+
+    actions = game['turns'][8]['actions'] + game['turns'][0]['actions']
+    assert codec.loads(codec.dumps(codec.pack_actions(actions))) == codec.pack_actions(actions)
+    assert codec.unpack_actions(codec.pack_actions(actions)) == actions
+    assert codec.loads('{"legacy": 1}') == {'legacy': 1}
+
+
+def test_reencode_legacy_rows(client, game3):
+    from django.core.management import call_command
+    from django.db import connection
+
+    expected = client.get(f'/{game3.pk}/data/').json()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE settlers_settlers SET game = %s WHERE id = %s',
+            [json.dumps(load_game('game3.json')), game3.pk]
+        )
+        call_command('settlers_reencode', stdout=open('/dev/null', 'w'))
+        cursor.execute('SELECT game FROM settlers_settlers WHERE id = %s', [game3.pk])
+        assert cursor.fetchone()[0].startswith('z1:')
+
+    assert client.get(f'/{game3.pk}/data/').json() == expected
+
+
+def test_game_field_is_lazy(game3, monkeypatch):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from settlers import codec
+    from settlers.codec import RawJSON
+
+    obj = models.Settlers.objects.get(pk=game3.pk)
+    assert isinstance(obj.__dict__['game'], RawJSON)
+
+    # Reading never takes a digest
+    with monkeypatch.context() as patch:
+        patch.setattr(codec, 'digest', None)
+        assert models.Settlers.objects.get(pk=game3.pk).game['players']
+
+    obj.game
+    with CaptureQueriesContext(connection) as context:
+        obj.save()
+    assert '"game"' not in context.captured_queries[-1]['sql']
+    obj = models.Settlers.objects.get(pk=game3.pk)
+    with CaptureQueriesContext(connection) as context:
+        obj.save()
+    assert '"game"' not in context.captured_queries[-1]['sql']
+    assert isinstance(obj.__dict__['game'], RawJSON)
+
+    obj.game['isSync'] = False
+    with CaptureQueriesContext(connection) as context:
+        obj.save()
+    assert any('"game"' in query['sql'] for query in context.captured_queries)
+    assert models.Settlers.objects.get(pk=game3.pk).is_sync is False
+
+    # Compared with what was just written, not with what was loaded
+    with CaptureQueriesContext(connection) as context:
+        obj.save()
+    assert '"game"' not in context.captured_queries[-1]['sql']
+
+
+def test_seeded_rolls_and_read_only_get(client, game3, players):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    roll = game3.next_roll
+    assert 2 <= roll <= 12
+    assert roll == models.seeded_roll(game3.seed, 44)
+    assert models.Settlers.objects.get(pk=game3.pk).next_roll == roll
+
+    client.force_login(players[0])
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(f'/{game3.pk}/')
+    assert response.context['viewer'] == {'user': players[0].id, 'nextRoll': roll}
+    assert not [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+    assert models.Settlers.objects.get(pk=game3.pk).version == game3.version
+
+    def post(roll):
+        return client.post(f'/{game3.pk}/', {
+            'turn': json.dumps({'roll': roll, 'color': 'orange', 'actions': []}),
+        }).status_code
+
+    assert post(roll % 12 + 1) == 400
+    assert post(roll) == 302
+    assert game3.turn_log.count() == 45
+
+
+def test_game_page_cache(client, game3, players):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    game3.migrate_turns()
+    spectator = User.objects.create_user('spectator')
+    models.SettlersProfile.objects.create(user=spectator)
+    client.force_login(spectator)
+
+    def view():
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(f'/{game3.pk}/')
+        log_queries = [q for q in context.captured_queries if 'settlers_settlersturn' in q['sql']]
+        return response, len(log_queries)
+
+    first, rendered = view()
+    assert rendered == 1
+    assert first.context['viewer'] == {}
+    second, rendered = view()
+    assert rendered == 0
+    assert second.content == first.content
+
+    game3.save_next_turn({'roll': game3.next_roll, 'color': 'orange', 'actions': []})
+    third, rendered = view()
+    assert rendered == 1
+    assert third.content != first.content
+
+
+def test_admin_changelist_and_turn_edit(admin_client, game3, django_assert_max_num_queries):
+    for _ in range(20):
+        models.Settlers.objects.create(game=load_game('game3.json'))
+
+    with django_assert_max_num_queries(6):
+        response = admin_client.get('/admin/settlers/settlers/')
+    assert response.status_code == 200
+    assert b'colleeniem, dlewis, david, danielle' in response.content
+
+    url = f'/admin/settlers/settlers/{game3.pk}/change/'
+    response = admin_client.get(url)
+    assert b'44 embedded turn(s)' in response.content and b'name="game"' not in response.content
+
+    game3.migrate_turns()
+    game3.replay()
+    assert game3.snapshots.count() == 2
+    turn = game3.turn_log.get(index=30)
+    response = admin_client.get(url)
+    assert b'Browse 44 turn(s)' in response.content
+    assert b'&quot;players&quot;' in response.content and b'name="game"' in response.content
+
+    # The game header is edited as raw JSON
+    form = response.context['adminform'].form
+    data = {name: form[name].value() for name in form.fields}
+    data = {name: '' if value is None else value for name, value in data.items()}
+    data['game'] = json.dumps(dict(game3.game, isSync=False))
+    response = admin_client.post(url, data)
+    assert response.status_code == 302
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert game.is_sync is False and game.turn_count == 44
+    assert game.version == game3.version + 1
+    game3 = game
+
+    response = admin_client.post(f'/admin/settlers/settlersturn/{turn.pk}/change/', {
+        'color': turn.color,
+        'roll': 6,
+        'actions': json.dumps(turn.as_turn()['actions']),
+        'played_0': '2020-07-19',
+        'played_1': '06:08:51',
+    })
+    assert response.status_code == 302
+    assert list(game3.snapshots.values_list('index', flat=True)) == [20]
+    assert models.Settlers.objects.get(pk=game3.pk).version == game3.version + 1
+
+
+def test_archive_serves_inflated_game(client, game3, players):
+    from datetime import timedelta
+    from io import StringIO
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    # pk 1 is the demo game, which is never archived
+    game = models.Settlers.objects.create(game=load_game('game3.json'))
+    game.player_profiles.set(game3.player_profiles.all())
+    expected = client.get(f'/{game.pk}/data/').json()
+    scores = client.get(f'/{game.pk}/scores/').json()
+    models.Settlers.objects.update(updated=timezone.now() - timedelta(days=365))
+
+    out = StringIO()
+    notice = models.SettlersNotification.objects.create(
+        settlers=game, user=players[0], player='orange', extras={}
+    )
+    call_command('settlers_archive', idle_days=180, stdout=out)
+    assert 'Archived 0 game(s)' in out.getvalue()
+    notice.sent = timezone.now()
+    notice.save()
+
+    # Idle games are only archived when asked to
+    call_command('settlers_archive', stdout=out)
+    assert 'Archived 0 game(s)' in out.getvalue()
+    call_command('settlers_archive', idle_days=180, stdout=out)
+    assert 'Archived 1 game(s)' in out.getvalue()
+    assert list(models.Settlers.objects.values_list('pk', flat=True)) == [game3.pk]
+    archive = models.SettlersArchive.objects.get(pk=game.pk)
+    assert archive.turn_count == 44
+    assert len(archive.payload) < len(json.dumps(expected)) / 3
+
+    assert client.get(f'/{game.pk}/data/').json() == expected
+    assert client.get(f'/{game.pk}/scores/').json() == scores
+    client.force_login(players[0])
+    response = client.get(f'/{game.pk}/')
+    assert response.status_code == 200
+    assert response.context['form'] is None
+    assert client.post(f'/{game.pk}/', {'turn': '{}'}).status_code == 403
+    assert response.context['view'].is_user_player
+    mine = client.get('/api/status/?mine=1').json()['games']
+    assert [(row['id'], row.get('archived')) for row in mine] == [(game3.pk, False), (game.pk, True)]
+
+    events = f'/{game.pk}/events/'
+    assert client.get(events, {'wait': 30, 'version': archive.version}).status_code == 304
+    assert client.get(events, {'wait': 0}).json()['version'] == archive.version
+
+    call_command('settlers_archive', restore=[game.pk], stdout=out)
+    assert f'Restored game {game.pk}' in out.getvalue()
+    assert not models.SettlersArchive.objects.exists()
+    game = models.get_game(game.pk)
+    assert not game.is_archived
+    assert game.turn_log.count() == game.turn_count == 44
+    assert game.created == archive.created
+    assert set(game.player_profiles.all()) == set(game3.player_profiles.all())
+    assert client.get(f'/{game.pk}/data/').json() == expected
+
+
+def test_expired_trade_offers_are_swept(game3, players, django_assert_max_num_queries):
+    from django.core.management import call_command
+    from django.utils import timezone
+    from settlers import trades
+
+    roll = game3.next_roll
+    game3.save_trade_offer([{'offers': [], 'wants': []}], {'roll': roll, 'color': 'orange', 'actions': []})
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert game.trade_expires_at == models.trade_expiry(game.game['tradeOffers'])
+
+    assert trades.expire_trades() == 0
+    later = game.trade_expires_at + models.TRADE_TIMEDELTA
+    with django_assert_max_num_queries(1):
+        assert trades.expired(later).count() == 1
+
+    assert trades.expire_trades(now=later) == 1
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert 'tradeOffers' not in game.game
+    assert game.trade_expires_at is None
+    assert game.next_roll == models.seeded_roll(game.seed, game.turn_count)
+    assert game.notifications.filter(name='trade-expired').count() == 4
+
+    call_command('settlers_expire_trades', stdout=open('/dev/null', 'w'))
+    assert trades.expire_trades(now=later) == 0
+
+
+def test_played_turn_closes_trade_offer(game3):
+    turn = {'roll': game3.next_roll, 'color': 'orange', 'actions': []}
+    game3.save_trade_offer([{'offers': [], 'wants': []}], turn)
+    game3.save_next_turn(turn)
+    game = models.Settlers.objects.get(pk=game3.pk)
+    assert 'tradeOffers' not in game.game
+    assert game.trade_expires_at is None
+
+
+def test_ndjson_export_import(game3, players, tmp_path):
+    from io import StringIO
+    from django.core.management import call_command
+
+    path = str(tmp_path / 'games.ndjson.gz')
+    expected = game3.legacy_game
+    null = open('/dev/null', 'w')
+    archived = models.Settlers.objects.create(game=load_game('game3.json'))
+    archived.player_profiles.set(game3.player_profiles.all())
+    models.SettlersArchive.archive(archived.pk)
+    call_command('settlers_export', path, stderr=null)
+    call_command('settlers_export', str(tmp_path / 'none.ndjson'), stage='init1', stderr=null)
+    assert (tmp_path / 'none.ndjson').read_text() == ''
+
+    models.Settlers.objects.all().delete()
+    models.SettlersArchive.objects.all().delete()
+    call_command('settlers_import', path, player='nobody', stdout=null)
+    assert not models.Settlers.objects.exists()
+
+    call_command('settlers_import', path, stdout=null)
+    game, restored = models.Settlers.objects.order_by('pk')
+    assert restored.turn_count == 44
+    assert {p.user for p in restored.player_profiles.all()} == set(players)
+    assert game.pk != game3.pk
+    assert json.loads(json.dumps(game.legacy_game, cls=models.DjangoJSONEncoder)) == json.loads(
+        json.dumps(expected, cls=models.DjangoJSONEncoder)
+    )
+    assert (game.seed, game.turn_count, game.updated) == (game3.seed, 44, game3.updated)
+    assert game.turn_log.count() == 44
+    assert {p.user for p in game.player_profiles.all()} == set(players)
+
+    # Games of players missing here are skipped rather than keep foreign ids
+    models.Settlers.objects.all().delete()
+    players[3].delete()
+    err = StringIO()
+    call_command('settlers_import', path, stdout=null, stderr=err)
+    assert not models.Settlers.objects.exists()
+    assert players[3].username in err.getvalue()
+
+
+def test_stats_incremental_matches_rebuild(admin_client, game3):
+    from django.core.management import call_command
+    from settlers import stats
+
+    game = models.Settlers.objects.create(game=load_game('game3.json'))
+    game.migrate_turns()
+    turns = game.turns
+    turns[-1] = dict(turns[-1], actions=turns[-1]['actions'] + [{'type': 'win'}])
+    # Start counting with the last turns still to play
+    game.turn_log.filter(index__gte=40).delete()
+    models.Settlers.objects.filter(pk=game.pk).update(turn_count=40)
+    game = models.Settlers.objects.get(pk=game.pk)
+    stats.record_turns(game)
+    for turn in turns[40:]:
+        game.save_next_turn(turn)
+    incremental = stats.league()
+    per_game = admin_client.get(f'/stats/league/?game={game.pk}').json()
+
+    call_command('settlers_rebuild_stats', stdout=open('/dev/null', 'w'))
+    assert admin_client.get('/stats/league/').json() == incremental
+    assert admin_client.get(f'/stats/league/?game={game.pk}').json() == per_game
+    assert sum(incremental['rolls'].values()) == sum(1 for turn in turns if turn.get('roll'))
+    assert sum(incremental['production'].values()) == sum(per_game['production'].values()) > 0
+    assert per_game['turns'] == 44
+    assert incremental['finished'] == 1 and incremental['averageLength'] == 44
+    assert incremental['colors'][per_game['winner']]['wins'] == 1
+
+    models.SettlersArchive.archive(game.pk)
+    call_command('settlers_rebuild_stats', stdout=open('/dev/null', 'w'))
+    assert admin_client.get('/stats/league/').json() == incremental
+
+
+def test_stats_failure_keeps_turn(client, game3, players, monkeypatch, caplog):
+    from settlers import stats
+
+    def broken(obj, start=0):
+        raise KeyError('roads')
+
+    monkeypatch.setattr(stats, 'tally', broken)
+    monkeypatch.setattr(stats, 'EXCLUDED_GAMES', ())
+    client.force_login(players[0])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': json.dumps({'roll': game3.next_roll, 'color': 'orange', 'actions': []}),
+        'version': game3.version,
+    })
+    assert response.status_code == 302
+    assert models.Settlers.objects.get(pk=game3.pk).turn_count == 45
+    assert not models.SettlersGameStats.objects.exists()
+    assert 'Could not record statistics' in caplog.text
+
+
+def test_turn_validation(client, game3, players):
+    from settlers.validate import Validator, validate_turn
+
+    state = game3.replay()
+    topology = Replay(game3.game).topology
+    locations = {}
+    for hex_id, vertices in topology.hex_vertices.items():
+        for node, vertex in enumerate(vertices):
+            locations.setdefault(vertex, (hex_id, 'abcdef'[node]))
+
+    occupied = next(iter(state.vertices))
+    neighbor = topology.vertex_neighbors[occupied][0]
+    roll = game3.next_roll
+
+    def turn(*actions):
+        return {'roll': roll, 'color': 'orange', 'actions': list(actions)}
+
+    def build(kind, vertex):
+        hex_id, node = locations[vertex]
+        return {'type': kind, 'hex': hex_id, 'node': node}
+
+    validate_turn(game3, turn())
+    for bad in (
+        turn(build('settlement', occupied)),
+        turn(build('settlement', neighbor)),
+        turn({'type': 'robber', 'hex': state.robber}),
+        turn({'type': 'bogus'}),
+        turn({'type': 'win'}),
+        turn({'type': 'play'}),
+        turn({'type': 'road'}),
+        dict(turn(), color='red'),
+        dict(turn(), roll=None),
+        [],
+    ):
+        with pytest.raises(ReplayError):
+            validate_turn(game3, bad)
+
+    setup = Validator(game3.game)
+    for actions in ([], [build('settlement', occupied)] * 2):
+        with pytest.raises(ReplayError):
+            setup.play_turn({'roll': None, 'color': 'red', 'actions': actions})
+
+    client.force_login(players[0])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': json.dumps(turn(build('settlement', neighbor))),
+        'version': game3.version,
+    })
+    assert response.status_code == 400
+    response = client.post(f'/{game3.pk}/', {
+        'turn': json.dumps(turn({'type': 'city', 'node': 'a'})),
+        'version': game3.version,
+    })
+    assert response.status_code == 400
+    assert models.Settlers.objects.get(pk=game3.pk).turn_count == 44
+
+
+def test_victory_point_reveal_wins(client, game3, players, monkeypatch):
+    from settlers.layouts import get_layout
+
+    replay = Replay(game3.game)
+    state = game3.replay()
+    assert state.players['orange']['cards']['VP'] == 1
+    points = state.points_for('orange')['grandTotal']
+    monkeypatch.setitem(get_layout(replay.board.layout), 'pointsToWin', points)
+
+    client.force_login(players[0])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': json.dumps({
+            'roll': game3.next_roll,
+            'color': 'orange',
+            'actions': [{'type': 'play', 'card': 'VP'}, {'type': 'win', 'points': points}],
+        }),
+        'version': game3.version,
+    })
+    assert response.status_code == 302
+    state = models.Settlers.objects.get(pk=game3.pk).replay()
+    assert state.winner == 'orange'
+    assert state.points_for('orange')['grandTotal'] == points
+
+
+def test_client_road_building_in_history(client, game3, players):
+    from settlers.validate import Validator
+
+    game3.migrate_turns()
+    replay = Validator(game3.game, game3.replay())
+    locations = {}
+    for hex_id, edges in replay.topology.hex_edges.items():
+        for node, edge in enumerate(edges):
+            locations.setdefault(edge, [hex_id, 'abcdef'[node]])
+
+    roads = []
+    for edge in locations:
+        try:
+            replay._check_road(edge, 'orange')
+        except ReplayError:
+            continue
+        roads.append(locations[edge])
+        replay.state.edges[edge] = 'orange'
+        if len(roads) == 2:
+            break
+
+    # Road Building as the client used to send it, spread into the action
+    play = {'0': roads[0], '1': roads[1], 'type': 'play', 'card': 'RB'}
+    game3.save_next_turn({
+        'roll': game3.next_roll,
+        'color': 'orange',
+        'actions': [{'type': 'purchase', 'card': 'RB'}, play],
+    })
+    assert game3.replay().players['orange']['played']['RB'] == 1
+
+    client.force_login(players[1])
+    response = client.post(f'/{game3.pk}/', {
+        'turn': json.dumps({'roll': game3.next_roll, 'color': 'red', 'actions': []}),
+        'version': game3.version,
+    })
+    assert response.status_code == 302
+    assert models.Settlers.objects.get(pk=game3.pk).turn_count == 46
+
+
+@pytest.mark.django_db
+def test_simulate_games():
+    from django.core.management import call_command
+    from django.utils import timezone
+    from settlers.simulate import simulate
+    from settlers.validate import Validator
+
+    profiles = [(n, f'bot{n}') for n in range(1, 5)]
+    now = timezone.now()
+    assert simulate(3, 's', profiles=profiles, now=now) == simulate(3, 's', profiles=profiles, now=now)
+    for bot in ('greedy', 'random'):
+        for index in range(5):
+            game = simulate(index, seed='s', bot=bot, profiles=profiles)['game']
+            Validator(game).play(game['turns'])
+
+    stopped = [len(simulate(index, 's', profiles=profiles, unfinished=1)['game']['turns']) for index in range(6)]
+    assert max(stopped) > 8
+
+    call_command('settlers_simulate', count=6, batch_size=4, unfinished=0.5, stdout=open('/dev/null', 'w'))
+    games = models.Settlers.objects.all()
+    assert games.count() == 6
+    assert models.SettlersTurn.objects.count() == sum(game.turn_count for game in games)
+    for game in games:
+        assert game.player_profiles.count() == len(game.game['players'])
+        if game.current_stage == 'play' and not game.is_finished:
+            assert game.next_roll == models.seeded_roll(game.seed, game.turn_count)
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_replica_routing(client, settings):
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    settings.DATABASE_ROUTERS = ['settlers.routers.ReplicaRouter']
+    settings.SETTLERS_REPLICAS = ['replica']
+    settings.MIDDLEWARE = settings.MIDDLEWARE + ['settlers.routers.PrimaryPinningMiddleware']
+    game = models.Settlers.objects.create(game=load_game('game3.json'))
+
+    def replica_reads(method, url, **kwargs):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = getattr(client, method)(url, **kwargs)
+        return response, len(queries)
+
+    response, count = replica_reads('get', f'/{game.pk}/data/')
+    assert response.status_code == 200 and count
+    assert 'settlers_primary' not in response.cookies
+
+    user = models.User.objects.create_user('colleeniem', id=3)
+    models.SettlersProfile.objects.create(user=user)
+    client.force_login(user)
+    response, count = replica_reads('post', f'/{game.pk}/', data={
+        'turn': json.dumps({'roll': game.next_roll, 'color': 'orange', 'actions': []}),
+    })
+    assert response.status_code == 302 and count == 0
+    assert 'settlers_primary' in response.cookies
+
+    # Pinned to the primary while the cookie lasts
+    response, count = replica_reads('get', f'/{game.pk}/data/')
+    assert response.status_code == 200 and count == 0
+    client.cookies.pop('settlers_primary')
+    response, count = replica_reads('get', f'/{game.pk}/data/')
+    assert count and len(response.json()['turns']) == 45
+
+
+def test_games_status(client, game3, players, django_assert_num_queries):
+    other = models.Settlers.objects.create(game=load_game('game3.json'))
+    assert client.get('/api/status/').status_code == 400
+    assert client.get('/api/status/?ids=1,x').status_code == 400
+
+    # One query for the live games and one for the archive, as 999 is missing
+    with django_assert_num_queries(2):
+        response = client.get(f'/api/status/?ids={game3.pk},{other.pk},999')
+    games = response.json()['games']
+    assert [game['id'] for game in games] == [game3.pk, other.pk]
+    assert games[0]['turnCount'] == 44 and games[0]['myTurn'] is False
+
+    client.force_login(players[0])
+    response = client.get('/api/status/?mine=1')
+    game, = response.json()['games']
+    assert game['id'] == game3.pk and game['myTurn'] is True and game['tradeExpires'] is None
+
+    response = client.get('/api/status/?mine=1', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+    game3.save_trade_offer([], {'roll': game3.next_roll, 'color': 'orange', 'actions': []})
+    response = client.get('/api/status/?mine=1', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.json()['games'][0]['tradeExpires']
+
+
+def test_client_bundle(client, game3, players, settings, tmp_path):
+    from settlers import bundle
+
+    modules = bundle.module_graph('settlers/js/app.js')
+    assert modules[0] == 'settlers/js/utils.js'
+    assert modules[-1] == 'settlers/js/app.js'
+    assert len(modules) == 7
+
+    client.force_login(players[0])
+    page = client.get(f'/{game3.pk}/').content.decode()
+    assert page.count('rel="modulepreload"') == 7
+    assert "import { App } from '/static/settlers/js/app.js'" in page
+
+    manifest = bundle.build(tmp_path)
+    assert set(manifest) == set(modules)
+    name, = set(manifest.values())
+    assert bundle.immutable_file_test(None, f'/static/{name}')
+    code = (tmp_path / name).read_text()
+    assert '\nimport ' not in code
+    assert code.rstrip().endswith('};') and ' App,' in code.splitlines()[-1]
+
+    settings.STATICFILES_DIRS = [tmp_path]
+    page = client.get(f'/{game3.pk}/').content.decode()
+    assert page.count('rel="modulepreload"') == 1
+    assert f'<link rel="modulepreload" href="/static/{name}">' in page
+    assert f"import {{ App }} from '/static/{name}'" in page